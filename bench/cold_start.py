@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+
+# Runs in a fresh interpreter per sample, like a worker booting after fork/exec.
+_WORKER = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from conf.db import init_db
+init_db()
+ready = time.perf_counter()
+print(json.dumps({"import": imported - start, "init_db": ready - imported}))
+"""
+
+
+def _sample(mode: str, database_url: str) -> dict[str, float]:
+    env = {**os.environ, "DATABASE_URL": database_url, "DB_MIGRATE_MODE": mode, "PYTHONPATH": SRC}
+    out = subprocess.run([sys.executable, "-c", _WORKER], env=env, cwd=SRC, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Worker cold-start time per DB_MIGRATE_MODE.")
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(ROOT, 'output', 'cold_start.db')}")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.database_url.startswith("sqlite:///"):
+        os.makedirs(os.path.dirname(args.database_url[len("sqlite:///") :]), exist_ok=True)
+    env = {**os.environ, "DATABASE_URL": args.database_url, "PYTHONPATH": SRC}
+    subprocess.run([sys.executable, "-m", "conf.migrate", "upgrade"], env=env, cwd=SRC, check=True, capture_output=True)
+
+    print(f"{'mode':<8} {'import ms':>10} {'init_db ms':>11} {'total ms':>9}")
+    for mode in ("upgrade", "check", "skip"):
+        samples = [_sample(mode, args.database_url) for _ in range(args.runs)]
+        imported = statistics.median(s["import"] for s in samples) * 1000
+        init = statistics.median(s["init_db"] for s in samples) * 1000
+        print(f"{mode:<8} {imported:>10.1f} {init:>11.1f} {imported + init:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from jwt import PyJWT  # noqa: E402
+
+from middleware import keyring  # noqa: E402
+
+
+def _per_call_us(number: int, repeat: int, fn) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-token sign/verify cost of each JWT algorithm vs HS256.")
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    jwt = PyJWT()
+    payload = {"sub": "bench", "iat": int(time.time()), "exp": int(time.time()) + 3600, "uid": 1, "role": "user"}
+    secret = "x" * 32
+    hs_token = jwt.encode(payload, secret, algorithm="HS256")
+    hs_verify = _per_call_us(args.number, args.repeat, lambda: jwt.decode(hs_token, secret, algorithms=["HS256"]))
+    hs_sign = _per_call_us(args.number, args.repeat, lambda: jwt.encode(payload, secret, algorithm="HS256"))
+
+    print(f"{'alg':<7} {'sign us':>9} {'verify us':>10} {'vs HS256':>9} {'verify from PEM us':>19}")
+    print(f"{'HS256':<7} {hs_sign:>9.1f} {hs_verify:>10.1f} {1:>8.1f}x {'-':>19}")
+    with tempfile.TemporaryDirectory() as directory:
+        for alg in keyring.ALGORITHMS:
+            kid = alg.lower()
+            keyring.generate_key(directory, kid, alg)
+            entry = keyring.Keyring(directory).get(kid)
+            pem = open(os.path.join(directory, f"{kid}.pub.pem"), "rb").read()
+            token = jwt.encode(payload, entry.signing_key, algorithm=alg, headers={"kid": kid})
+
+            sign = _per_call_us(args.number, args.repeat, lambda: jwt.encode(payload, entry.signing_key, algorithm=alg))
+            verify = _per_call_us(args.number, args.repeat, lambda: jwt.decode(token, entry.verify_key, algorithms=[alg]))
+            from_pem = _per_call_us(args.number, args.repeat, lambda: jwt.decode(token, pem, algorithms=[alg]))
+            print(f"{alg:<7} {sign:>9.1f} {verify:>10.1f} {verify / hs_verify:>8.1f}x {from_pem:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
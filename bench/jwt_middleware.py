@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, HTTPException, Request  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from common import erri  # noqa: E402
+from middleware import auth  # noqa: E402
+from user.model import User  # noqa: E402
+
+
+def _base_http_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/protected")
+    async def protected():
+        return {"ok": True}
+
+    @app.middleware("http")
+    async def jwt_middleware(request: Request, call_next):
+        header = request.headers.get("Authorization")
+        if not header or not header.startswith("Bearer "):
+            return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+        try:
+            payload = auth.verify_token(header.split(" ", 1)[1])
+        except erri.BusinessError as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+        except HTTPException as e:
+            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+        request.state.user = payload.get("sub")
+        return await call_next(request)
+
+    return app
+
+
+def _asgi_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/protected")
+    async def protected():
+        return {"ok": True}
+
+    auth.setup_jwt_middleware(app)
+    return app
+
+
+async def _drive(app: FastAPI, token: str, requests: int, concurrency: int) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        remaining = iter(range(requests))
+
+        async def worker() -> None:
+            for _ in remaining:
+                resp = await client.get("/protected", headers=headers)
+                assert resp.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput of BaseHTTPMiddleware vs pure ASGI JWT middleware.")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    token = auth.create_token(User(id=1, username="bench", password="x"))
+    results = {}
+    for name, factory in (("BaseHTTPMiddleware", _base_http_app), ("pure ASGI", _asgi_app)):
+        app = factory()
+        asyncio.run(_drive(app, token, min(args.requests, 200), args.concurrency))
+        results[name] = asyncio.run(_drive(app, token, args.requests, args.concurrency))
+        print(f"{name:>20}: {results[name]:10.0f} req/s")
+
+    ratio = results["pure ASGI"] / results["BaseHTTPMiddleware"]
+    print(f"{'speedup':>20}: {ratio:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
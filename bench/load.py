@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "src"))
+
+import httpx  # noqa: E402
+
+Call = Callable[[httpx.AsyncClient, int], Awaitable[httpx.Response]]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": (len(latencies) + errors) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient, call: Call, requests: int, concurrency: int, offset: int = 0
+) -> dict[str, Any]:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(offset, offset + requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                resp = await call(client, i)
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def _prepare_database(database_url: str) -> None:
+    from sqlmodel import SQLModel
+
+    from conf import db
+
+    if database_url.startswith("sqlite"):
+        from user import model
+
+        _ = model.User
+        SQLModel.metadata.create_all(db.engine)
+    else:
+        db.init_db()
+
+
+def _client(args: argparse.Namespace) -> httpx.AsyncClient:
+    if args.base_url:
+        return httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+
+    from main import create_app
+
+    transport = httpx.ASGITransport(app=create_app())
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+
+
+async def run_suite(args: argparse.Namespace) -> dict[str, Any]:
+    run_id = uuid.uuid4().hex[:8]
+    password = "bench-password"
+    usernames = [f"bench-{run_id}-{i}" for i in range(args.requests + args.warmup)]
+
+    async with _client(args) as client:
+        tokens: list[str] = []
+
+        async def register(c: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await c.post("/user/register", json={"username": usernames[i], "password": password})
+
+        async def login(c: httpx.AsyncClient, i: int) -> httpx.Response:
+            resp = await c.post("/user/login", json={"username": usernames[i % args.users], "password": password})
+            if resp.status_code == 200 and len(tokens) < args.users:
+                tokens.append(resp.headers["x-jwt-token"])
+            return resp
+
+        def _auth(i: int) -> dict[str, str]:
+            return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+        async def whoami(c: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await c.get("/user/whoami", headers=_auth(i))
+
+        async def get_me(c: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await c.get("/user/me", headers=_auth(i))
+
+        async def patch_me(c: httpx.AsyncClient, i: int) -> httpx.Response:
+            return await c.patch("/user/me", headers=_auth(i), json={"nickname": f"bench-{i}"})
+
+        scenarios: list[tuple[str, Call, int]] = [
+            ("POST /user/register", register, args.requests),
+            ("POST /user/login", login, args.requests),
+            ("GET /user/whoami", whoami, args.requests),
+            ("GET /user/me", get_me, args.requests),
+            ("PATCH /user/me", patch_me, args.requests),
+        ]
+        endpoints: dict[str, Any] = {}
+        for name, call, requests in scenarios:
+            if args.only and name not in args.only:
+                continue
+            if name != "POST /user/register" and name != "POST /user/login" and not tokens:
+                raise SystemExit("no tokens available: the login scenario must run before authenticated endpoints")
+            await run_endpoint(client, call, args.warmup, args.concurrency, offset=requests)
+            endpoints[name] = await run_endpoint(client, call, requests, args.concurrency)
+            print(_format_row(name, endpoints[name]))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "target": args.base_url or os.environ.get("DATABASE_URL", ""),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "endpoints": endpoints,
+    }
+
+
+def _format_row(name: str, stats: dict[str, Any]) -> str:
+    return (
+        f"{name:<22} rps={stats['rps']:9.1f}  p50={stats['p50_ms']:8.2f}ms  "
+        f"p95={stats['p95_ms']:8.2f}ms  p99={stats['p99_ms']:8.2f}ms  errors={stats['errors']}"
+    )
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    regressions: list[str] = []
+    for name, base in baseline.get("endpoints", {}).items():
+        current = result["endpoints"].get(name)
+        if current is None:
+            continue
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']:.1f} < baseline {base['rps']:.1f}")
+        if current["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99_ms']:.2f}ms > baseline {base['p99_ms']:.2f}ms")
+        if current["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {current['errors']} > baseline {base['errors']}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmark for the /user endpoints.")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL", f"sqlite:///{ROOT_DIR / 'output' / 'bench.db'}"))
+    parser.add_argument("--base-url", help="drive a running server instead of booting create_app() in-process")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50, help="distinct accounts used by authenticated endpoints")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--only", action="append", help="endpoint to run, e.g. 'GET /user/me' (repeatable)")
+    parser.add_argument("--output", type=Path, default=ROOT_DIR / "output" / "bench" / "load.json")
+    parser.add_argument("--baseline", type=Path, help="stored result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args()
+    args.users = max(1, min(args.users, args.requests))
+
+    os.environ["DATABASE_URL"] = args.database_url
+    # Every bench request comes from one client address; per-IP login throttling would turn the run into 429s.
+    os.environ.setdefault("THROTTLE_BACKEND", "none")
+    if not args.base_url:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        _prepare_database(args.database_url)
+
+    result = asyncio.run(run_suite(args))
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
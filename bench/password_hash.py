@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from user import password as passwords  # noqa: E402
+
+
+async def _parallel(encoded: str, logins: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(passwords.verify_password_async("bench-password", encoded) for _ in range(logins)))
+    return logins / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Login verification throughput at the configured KDF cost.")
+    parser.add_argument("--logins", type=int, default=50)
+    args = parser.parse_args()
+
+    encoded = passwords.hash_password("bench-password")
+    print(f"hash format:      {encoded.split('$')[1]} {encoded.split('$')[2]}")
+
+    start = time.perf_counter()
+    for _ in range(args.logins):
+        passwords.verify_password("bench-password", encoded)
+    per_core = args.logins / (time.perf_counter() - start)
+
+    pooled = asyncio.run(_parallel(encoded, args.logins))
+    legacy = passwords.legacy_hash("bench-password")
+    start = time.perf_counter()
+    for _ in range(args.logins):
+        passwords.verify_password("bench-password", legacy)
+    legacy_rate = args.logins / (time.perf_counter() - start)
+
+    print(f"workers:          {passwords.PASSWORD_HASH_WORKERS}")
+    print(f"logins/s/core:    {per_core:10.1f}")
+    print(f"logins/s (pool):  {pooled:10.1f}")
+    print(f"legacy sha512:    {legacy_rate:10.1f} logins/s")
+    passwords.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import APIRoute, serialize_response  # noqa: E402
+
+from common import response  # noqa: E402
+from user import dto  # noqa: E402
+from user.model import User  # noqa: E402
+
+
+def _response_field(model):
+    app = FastAPI()
+    app.get("/", response_model=model)(lambda: None)
+    return next(route for route in app.routes if isinstance(route, APIRoute)).response_field
+
+
+# What FastAPI did per response before: hand-built DTO, response_model validation, jsonable dict, stdlib JSON.
+async def _legacy(user: User, field) -> bytes:
+    content = dto.UserProfileResponse(
+        username=user.username,
+        nickname=user.nickname,
+        email=user.email,
+        avatar_url=user.avatar_url,
+        role=user.role,
+        is_active=user.is_active,
+    )
+    return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+
+async def _fast(user: User, field) -> bytes:
+    return response.FastJSONResponse(dto.UserProfileResponse.model_validate(user)).body
+
+
+async def _per_call_us(fn, user: User, field, number: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn(user, field)
+        best = min(best, time.perf_counter() - start)
+    return best / number * 1e6
+
+
+async def _run(number: int, repeat: int) -> None:
+    user = User(
+        id=1,
+        username="bench",
+        password="x",
+        nickname="Bench User",
+        email="bench@example.com",
+        avatar_url="https://example.com/a.png",
+        created_at=datetime.now(timezone.utc),
+    )
+    field = _response_field(dto.UserProfileResponse)
+    assert (await _legacy(user, field)).replace(b" ", b"") == (await _fast(user, field)).replace(b" ", b"")
+
+    legacy = await _per_call_us(_legacy, user, field, number, repeat)
+    fast = await _per_call_us(_fast, user, field, number, repeat)
+    print(f"json backend:          {response.JSON_BACKEND}")
+    print(f"response_model path:   {legacy:8.2f} us/response")
+    print(f"pre-serialized path:   {fast:8.2f} us/response")
+    print(f"saving per response:   {legacy - fast:8.2f} us ({legacy / fast:.1f}x)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-response serialization cost of the user profile DTO.")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(_run(args.number, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
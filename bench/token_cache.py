@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from common.cache import LRUCache, NullCache  # noqa: E402
+from middleware import auth  # noqa: E402
+from user.model import User  # noqa: E402
+
+
+def _per_call_us(number: int, repeat: int, fn) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-request cost of verify_token with and without the token cache.")
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    token = auth.create_token(User(id=1, username="bench", password="x"))
+
+    auth.token_cache = NullCache()
+    uncached = _per_call_us(args.number, args.repeat, lambda: auth.verify_token(token))
+
+    auth.token_cache = LRUCache(maxsize=1024, ttl=3600)
+    auth.verify_token(token)
+    cached = _per_call_us(args.number, args.repeat, lambda: auth.verify_token(token))
+
+    print(f"verify_token uncached: {uncached:8.2f} us/call")
+    print(f"verify_token cached:   {cached:8.2f} us/call")
+    print(f"saving per request:    {uncached - cached:8.2f} us ({uncached / cached:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
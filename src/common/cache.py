@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Protocol
+
+from common.kvstore import KVStore, connect
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class Cache(Protocol):
+    stats: CacheStats
+
+    def get(self, key: str) -> Optional[Any]: ...
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None: ...
+
+    def delete(self, key: str) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def info(self) -> dict[str, Any]: ...
+
+
+class LRUCache:
+    def __init__(self, *, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": "memory", "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl, **self.stats.as_dict()}
+
+
+class SharedCache:
+    def __init__(self, store: KVStore, *, prefix: str, ttl: float):
+        self.store = store
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.store.get(self.prefix + key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        seconds = max(1, math.ceil(self.ttl if ttl is None else ttl))
+        self.store.set(self.prefix + key, json.dumps(value, separators=(",", ":")).encode("utf-8"), ex=seconds)
+
+    def delete(self, key: str) -> None:
+        self.store.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        pass
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": "shared", "prefix": self.prefix, "ttl": self.ttl, **self.stats.as_dict()}
+
+
+class NullCache:
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        self.stats.misses += 1
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": "none", **self.stats.as_dict()}
+
+
+def build_cache(backend: str, *, maxsize: int, ttl: float, url: str, prefix: str) -> Cache:
+    if backend == "memory":
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if backend == "shared":
+        return SharedCache(connect(url), prefix=prefix, ttl=ttl)
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"unknown cache backend: {backend!r}")
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import math
+
 
 class BusinessError(Exception):
-    def __init__(self, *, status_code: int, detail: str):
+    def __init__(self, *, status_code: int, detail: str, headers: dict[str, str] | None = None):
         self.status_code = status_code
         self.detail = detail
+        self.headers = headers
         super().__init__(detail)
 
 
@@ -28,6 +31,14 @@ def conflict(detail: str) -> BusinessError:
     return BusinessError(status_code=409, detail=detail)
 
 
+def too_many_requests(detail: str, retry_after: float) -> BusinessError:
+    return BusinessError(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+
 def internal(detail: str) -> BusinessError:
     return BusinessError(status_code=500, detail=detail)
 
+
+def service_unavailable(detail: str) -> BusinessError:
+    return BusinessError(status_code=503, detail=detail)
+
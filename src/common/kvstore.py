@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional, Protocol
+
+
+class KVStore(Protocol):
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> object: ...
+
+    def delete(self, *keys: str) -> object: ...
+
+    def incr(self, key: str, amount: int = 1) -> int: ...
+
+    def expire(self, key: str, seconds: int) -> object: ...
+
+
+class MemoryStore:
+    def __init__(self) -> None:
+        self._data: dict[str, tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        expires_at = time.monotonic() + ex if ex is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value, expires_at = self._data.get(key, (b"0", None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                value, expires_at = b"0", None
+            count = int(value) + amount
+            self._data[key] = (str(count).encode(), expires_at)
+            return count
+
+    def expire(self, key: str, seconds: int) -> bool:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False
+            self._data[key] = (item[0], time.monotonic() + seconds)
+            return True
+
+
+def connect(url: str) -> KVStore:
+    if url.startswith("memory://"):
+        return MemoryStore()
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError(f"shared store {url!r} requires the 'redis' package: {e}")
+    return redis.Redis.from_url(url)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence, TypeVar
+
+from common.histogram import Histogram
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+TFunc = TypeVar("TFunc", bound=Callable[..., Any])
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Mapping[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Mapping[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = dict(self._values)
+        if self._callback is not None:
+            items.update(self._callback())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class HistogramMetric(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._children: dict[LabelValues, Histogram] = {}
+
+    def labels(self, **labels: str) -> Histogram:
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, Histogram(self.buckets))
+        return child
+
+    def attach(self, histogram: Histogram, **labels: str) -> None:
+        with self._lock:
+            self._children[self._key(labels)] = histogram
+
+    def observe(self, value: float, **labels: str) -> None:
+        self.labels(**labels).observe(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        child = self.labels(**labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            child.observe(time.perf_counter() - start)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._children.items())
+        lines: list[str] = []
+        for key, child in items:
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(snapshot['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {snapshot['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: list[str] = []
+        for metric in metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    callback: Optional[Callable[[], Mapping[LabelValues, float]]] = None,
+) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames, callback))
+
+
+def gauge(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    callback: Optional[Callable[[], Mapping[LabelValues, float]]] = None,
+) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames, callback))
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> HistogramMetric:
+    return REGISTRY.register(HistogramMetric(name, documentation, labelnames, buckets))
+
+
+def timed(metric: HistogramMetric, **labels: str) -> Callable[[TFunc], TFunc]:
+    def decorator(fn: TFunc) -> TFunc:
+        child = metric.labels(**labels)
+
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - start)
+
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+from dataclasses import dataclass
+from typing import Any, Optional, Protocol
+
+from common.kvstore import KVStore, connect
+
+
+@dataclass(frozen=True, slots=True)
+class Rate:
+    limit: int
+    period: float
+
+    def __post_init__(self) -> None:
+        if self.limit <= 0 or self.period <= 0:
+            raise ValueError(f"rate limit and period must be positive, got {self.limit}/{self.period:g} (use 'off' to disable)")
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional["Rate"]:
+        if not spec or spec.strip() in ("0", "off"):
+            return None
+        limit, _, period = spec.partition("/")
+        return cls(limit=int(limit), period=float(period or 1))
+
+    @property
+    def per_second(self) -> float:
+        return self.limit / self.period
+
+
+class RateLimiter(Protocol):
+    def hit(self, key: str, rate: Rate) -> float: ...
+
+    def info(self) -> dict[str, Any]: ...
+
+
+# Token bucket per key: two floats per active key. Entries are kept in
+# last-touched order; a bucket that has refilled completely is equivalent to
+# an absent one, so idle keys are dropped from the front as they go full. Only
+# full buckets are ever evicted: dropping a drained one would hand its key a
+# fresh burst. When max_keys buckets are all still refilling, a new key is
+# refused until one of them is full, so spraying keys can't reset anyone's limit.
+class TokenBucketLimiter:
+    # How many of the least recently used buckets a new key looks through for a full one.
+    EVICT_SCAN = 64
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.overflows = 0
+
+    def hit(self, key: str, rate: Rate) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            if bucket is None and not self._make_room(now):
+                self.overflows += 1
+                _, (_, _, full_at) = next(iter(self._buckets.items()))
+                return max(full_at - now, 1 / rate.per_second)
+            tokens = float(rate.limit)
+            if bucket is not None:
+                tokens = min(tokens, bucket[0] + (now - bucket[1]) * rate.per_second)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate.per_second
+            self._buckets[key] = (tokens, now, now + (rate.limit - tokens) / rate.per_second)
+            self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float) -> None:
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                return
+            del self._buckets[key]
+            self.evictions += 1
+
+    def _make_room(self, now: float) -> bool:
+        if len(self._buckets) < self.max_keys:
+            return True
+        full = [key for key, (_, _, full_at) in islice(self._buckets.items(), self.EVICT_SCAN) if full_at <= now]
+        for key in full[: len(self._buckets) - self.max_keys + 1]:
+            del self._buckets[key]
+            self.evictions += 1
+        return len(self._buckets) < self.max_keys
+
+    def info(self) -> dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "evictions": self.evictions,
+            "overflows": self.overflows,
+        }
+
+
+# Sliding-window counter over a shared store: the previous fixed window's
+# count is weighted by how much of it still overlaps the sliding window.
+# Only INCR/EXPIRE/GET are needed, so Redis and MemoryStore both work. A
+# rejected hit is taken back out of the window so that it doesn't count.
+class SlidingWindowLimiter:
+    def __init__(self, store: KVStore, prefix: str = "throttle:") -> None:
+        self.store = store
+        self.prefix = prefix
+
+    def hit(self, key: str, rate: Rate) -> float:
+        now = time.time()
+        window = int(now // rate.period)
+        elapsed = now - window * rate.period
+        current_key = f"{self.prefix}{key}:{window}"
+        current = int(self.store.incr(current_key))
+        if current == 1:
+            self.store.expire(current_key, int(2 * rate.period) + 1)
+        previous = int(self.store.get(f"{self.prefix}{key}:{window - 1}") or 0)
+        weight = 1 - elapsed / rate.period
+        if previous * weight + current <= rate.limit:
+            return 0.0
+        self.store.incr(current_key, -1)
+        if current > rate.limit or previous == 0:
+            return rate.period - elapsed
+        # Time until the previous window's weight has decayed enough to admit one more.
+        return max(rate.period * (1 - (rate.limit - current) / previous) - elapsed, 0.001)
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": "shared", "prefix": self.prefix}
+
+
+class NullLimiter:
+    def hit(self, key: str, rate: Rate) -> float:
+        return 0.0
+
+    def info(self) -> dict[str, Any]:
+        return {"backend": "none"}
+
+
+def build_limiter(backend: str, *, max_keys: int, url: str, prefix: str) -> RateLimiter:
+    if backend == "memory":
+        return TokenBucketLimiter(max_keys=max_keys)
+    if backend == "shared":
+        return SlidingWindowLimiter(connect(url), prefix=prefix)
+    if backend == "none":
+        return NullLimiter()
+    raise ValueError(f"unknown throttle backend: {backend!r}")
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _stdlib_dumps(content: Any) -> bytes:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _select_dumps() -> tuple[str, Callable[[Any], bytes]]:
+    try:
+        import orjson
+
+        return "orjson", orjson.dumps
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        return "msgspec", msgspec.json.Encoder().encode
+    except ImportError:
+        pass
+    return "json", _stdlib_dumps
+
+
+JSON_BACKEND, _dumps = _select_dumps()
+
+
+def dumps(content: Any) -> bytes:
+    # Pydantic models are serialized by pydantic-core directly; no second validation.
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    return _dumps(content)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+# Concurrent do(key, fn) calls share one execution of fn: the first caller
+# runs it, everyone else blocks until it finishes and gets the same result or
+# exception. Nothing is remembered once the call completes; caching is the
+# caller's job.
+class SingleFlight:
+    def __init__(self) -> None:
+        self.shared = 0
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                self.forget(key, call)
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def forget(self, key: Hashable, call: Optional[_Call] = None) -> None:
+        # Called on writes so that lookups starting afterwards don't join a read
+        # that may predate the write.
+        with self._lock:
+            if call is None or self._calls.get(key) is call:
+                self._calls.pop(key, None)
+
+
+# The asyncio counterpart. fn runs in its own task so that a cancelled caller
+# (e.g. a client disconnect) doesn't take the shared result away from the rest.
+class AsyncSingleFlight:
+    def __init__(self) -> None:
+        self.shared = 0
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.shared += 1
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
+
+    def forget(self, key: Hashable) -> None:
+        self._calls.pop(key, None)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+_SEARCH_COLUMNS = ("username", "nickname", "email")
+
+
+def upgrade() -> None:
+    op.create_index("ix_user_created_at_id", "user", ["created_at", "id"])
+    op.create_index("ix_user_role_is_active_created_at_id", "user", ["role", "is_active", "created_at", "id"])
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Prefix LIKE only uses a btree under the C collation, hence text_pattern_ops;
+    # substring ILIKE needs the trigram GIN indexes.
+    with op.get_context().autocommit_block():
+        for column in _SEARCH_COLUMNS:
+            op.create_index(
+                f"ix_user_{column}_pattern",
+                "user",
+                [column],
+                postgresql_ops={column: "text_pattern_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+            op.create_index(
+                f"ix_user_{column}_trgm",
+                "user",
+                [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        for column in _SEARCH_COLUMNS:
+            op.drop_index(f"ix_user_{column}_trgm", table_name="user", if_exists=True)
+            op.drop_index(f"ix_user_{column}_pattern", table_name="user", if_exists=True)
+    op.drop_index("ix_user_role_is_active_created_at_id", table_name="user")
+    op.drop_index("ix_user_created_at_id", table_name="user")
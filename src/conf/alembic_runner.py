@@ -1,20 +1,99 @@
 from __future__ import annotations
 
+import ast
+from contextlib import contextmanager
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, Optional
 
-from alembic.command import upgrade
-from alembic.config import Config
+from sqlalchemy import Engine, exc, text
 
 from conf.config import DATABASE_URL
 
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+# Arbitrary application-wide key for pg_advisory_lock; every migrator uses the same one.
+MIGRATION_LOCK_ID = 0x75736572
+
+_CONF_DIR = Path(__file__).resolve().parent
+_VERSIONS_DIR = _CONF_DIR / "alembic" / "versions"
+
 
 def _alembic_config() -> Config:
-    conf_dir = Path(__file__).resolve().parent
-    config = Config(str(conf_dir / "alembic.ini"))
-    config.set_main_option("script_location", str(conf_dir / "alembic"))
+    from alembic.config import Config
+
+    config = Config(str(_CONF_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(_CONF_DIR / "alembic"))
     config.set_main_option("sqlalchemy.url", DATABASE_URL)
     return config
 
 
-def upgrade_head() -> None:
-    upgrade(_alembic_config(), "head")
+@contextmanager
+def _migration_lock(engine: Engine) -> Iterator[None]:
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+
+
+def upgrade_head(engine: Optional[Engine] = None) -> None:
+    from alembic.command import upgrade
+
+    if engine is None:
+        upgrade(_alembic_config(), "head")
+        return
+    with _migration_lock(engine):
+        upgrade(_alembic_config(), "head")
+
+
+def head_revision() -> Optional[str]:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(_alembic_config()).get_current_head()
+
+
+def _revision_ids(path: Path) -> tuple[Optional[str], Optional[str]]:
+    ids: dict[str, Optional[str]] = {}
+    for node in ast.parse(path.read_text()).body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            if node.targets[0].id in ("revision", "down_revision"):
+                ids[node.targets[0].id] = ast.literal_eval(node.value)
+    return ids.get("revision"), ids.get("down_revision")
+
+
+# Workers only need "is the database at head", which does not justify importing
+# Alembic (~200 ms): read the revision graph from the version files directly.
+def script_head() -> Optional[str]:
+    revisions, parents = set(), set()
+    for path in _VERSIONS_DIR.glob("*.py"):
+        revision, down_revision = _revision_ids(path)
+        if revision:
+            revisions.add(revision)
+        if down_revision:
+            parents.update([down_revision] if isinstance(down_revision, str) else down_revision)
+    heads = revisions - parents
+    if len(heads) > 1:
+        raise RuntimeError(f"Multiple migration heads: {sorted(heads)}")
+    return next(iter(heads), None)
+
+
+def current_revision(engine: Engine) -> Optional[str]:
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar_one_or_none()
+        except exc.DBAPIError:
+            return None
+
+
+def check_head(engine: Engine) -> None:
+    current, head = current_revision(engine), script_head()
+    if current != head:
+        raise RuntimeError(
+            f"Database schema is at revision {current!r}, expected {head!r}. Run `python -m conf.migrate upgrade` first."
+        )
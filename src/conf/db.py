@@ -1,14 +1,162 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, Pool, QueuePool
 from sqlmodel import create_engine
 
-from conf.config import DATABASE_URL
-from conf.alembic_runner import upgrade_head
+from conf.config import (
+    DATABASE_URL,
+    DB_ASYNC,
+    DB_EXTERNAL_POOLER,
+    DB_MAX_OVERFLOW,
+    DB_MIGRATE_MODE,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+)
+from common import metrics
+from conf.pool import PoolStats, instrumented_pool_class, pool_snapshot, track_checkouts
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+def _engine_options(pool_cls: type[Pool], stats: PoolStats) -> dict[str, Any]:
+    if DB_EXTERNAL_POOLER:
+        return {
+            "poolclass": instrumented_pool_class(NullPool, stats),
+            "pool_pre_ping": DB_POOL_PRE_PING,
+        }
+    return {
+        "poolclass": instrumented_pool_class(pool_cls, stats),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+# Engines (and the DBAPI driver they import) are built on first use rather than
+# at import time; `db.engine` / `db.async_engine` resolve through __getattr__
+# once and are plain module globals afterwards.
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    if "engine" in globals():
+        return globals()["engine"]
+    with _engine_lock:
+        if "engine" not in globals():
+            created = create_engine(DATABASE_URL, **_engine_options(QueuePool, pool_stats))
+            track_checkouts(created, pool_stats)
+            globals()["engine"] = created
+    return globals()["engine"]
+
+
+def get_async_engine() -> AsyncEngine | None:
+    if "async_engine" in globals():
+        return globals()["async_engine"]
+    with _engine_lock:
+        if "async_engine" not in globals():
+            created = None
+            if DB_ASYNC:
+                from sqlalchemy.ext.asyncio import create_async_engine
+
+                created = create_async_engine(DATABASE_URL, **_engine_options(AsyncAdaptedQueuePool, async_pool_stats))
+                track_checkouts(created.sync_engine, async_pool_stats)
+            globals()["async_engine"] = created
+    return globals()["async_engine"]
+
+
+def __getattr__(name: str) -> Any:
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-engine = create_engine(DATABASE_URL)
+
+# A forked worker must never reuse the parent's pooled connections. close=False
+# drops the pool references without closing sockets the parent still owns.
+def _reset_after_fork() -> None:
+    if globals().get("engine") is not None:
+        globals()["engine"].dispose(close=False)
+    if globals().get("async_engine") is not None:
+        globals()["async_engine"].sync_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _pools() -> dict[str, tuple[Pool, PoolStats]]:
+    pools = {}
+    if globals().get("engine") is not None:
+        pools["sync"] = (globals()["engine"].pool, pool_stats)
+    if globals().get("async_engine") is not None:
+        pools["async"] = (globals()["async_engine"].pool, async_pool_stats)
+    return pools
+
+
+def _overflow(pool: Pool) -> float:
+    overflow = getattr(pool, "overflow", None)
+    return max(overflow(), 0) if callable(overflow) else 0
+
+
+metrics.gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of the pool.",
+    ("engine",),
+    callback=lambda: {(name,): stats.checked_out for name, (_, stats) in _pools().items()},
+)
+metrics.gauge(
+    "db_pool_overflow",
+    "Overflow connections currently open beyond pool_size.",
+    ("engine",),
+    callback=lambda: {(name,): _overflow(pool) for name, (pool, _) in _pools().items()},
+)
+metrics.counter(
+    "db_pool_checkout_timeouts_total",
+    "Pool checkouts that timed out waiting for a connection.",
+    ("engine",),
+    callback=lambda: {(name,): stats.checkout_timeouts for name, (_, stats) in _pools().items()},
+)
+_checkout_wait = metrics.histogram("db_pool_checkout_wait_seconds", "Time spent checking out a connection.", ("engine",))
+_checkout_wait.attach(pool_stats.checkout_wait, engine="sync")
+if DB_ASYNC:
+    _checkout_wait.attach(async_pool_stats.checkout_wait, engine="async")
+
+
+def get_pool_stats() -> dict[str, Any]:
+    return {name: pool_snapshot(pool, stats) for name, (pool, stats) in _pools().items()}
 
 
 def init_db() -> None:
-    upgrade_head()
+    if DB_MIGRATE_MODE == "skip":
+        return
+    if DB_MIGRATE_MODE not in ("upgrade", "check"):
+        raise ValueError(f"Unknown DB_MIGRATE_MODE {DB_MIGRATE_MODE!r}; expected upgrade, check or skip")
+    from conf import alembic_runner
+
+    if DB_MIGRATE_MODE == "upgrade":
+        alembic_runner.upgrade_head(get_engine())
+    else:
+        alembic_runner.check_head(get_engine())
 
 
 def close_db() -> None:
-    engine.dispose()
+    if globals().get("engine") is not None:
+        globals()["engine"].dispose()
+
+
+async def close_async_db() -> None:
+    if globals().get("async_engine") is not None:
+        await globals()["async_engine"].dispose()
@@ -0,0 +1,29 @@
+import argparse
+from typing import Optional
+
+from conf import alembic_runner
+from conf.db import engine
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m conf.migrate", description="Run or verify database migrations once, outside the workers.")
+    parser.add_argument("action", choices=("upgrade", "check", "current"), nargs="?", default="upgrade")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.action == "upgrade":
+            alembic_runner.upgrade_head(engine)
+        elif args.action == "check":
+            alembic_runner.check_head(engine)
+        else:
+            print(alembic_runner.current_revision(engine) or "<empty>")
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from common.histogram import Histogram
+
+CHECKOUT_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PoolStats:
+    def __init__(self) -> None:
+        self.checkout_wait = Histogram(CHECKOUT_WAIT_BUCKETS)
+        self.checkout_timeouts = 0
+        self.checked_out = 0
+        self._lock = threading.Lock()
+
+    def _add(self, attr: str, delta: int) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + delta)
+
+
+def instrumented_pool_class(pool_cls: type[Pool], stats: PoolStats) -> type[Pool]:
+    class _InstrumentedPool(pool_cls):  # type: ignore[valid-type, misc]
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                return super().connect()
+            except exc.TimeoutError:
+                stats._add("checkout_timeouts", 1)
+                raise
+            finally:
+                stats.checkout_wait.observe(time.perf_counter() - start)
+
+    _InstrumentedPool.__name__ = f"Instrumented{pool_cls.__name__}"
+    _InstrumentedPool.__qualname__ = _InstrumentedPool.__name__
+    return _InstrumentedPool
+
+
+def track_checkouts(engine: Engine, stats: PoolStats) -> None:
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(*_: Any) -> None:
+        stats._add("checked_out", 1)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(*_: Any) -> None:
+        stats._add("checked_out", -1)
+
+
+def pool_snapshot(pool: Pool, stats: PoolStats) -> dict[str, Any]:
+    size = getattr(pool, "size", None)
+    overflow = getattr(pool, "overflow", None)
+    return {
+        "pool_class": type(pool).__name__,
+        "size": size() if callable(size) else None,
+        "checked_out": stats.checked_out,
+        "overflow": max(overflow(), 0) if callable(overflow) else None,
+        "checkout_timeouts": stats.checkout_timeouts,
+        "checkout_wait_seconds": stats.checkout_wait.snapshot(),
+    }
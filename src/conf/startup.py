@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+from conf.config import STARTUP_BUDGET_MS
+
+# Modules that must stay out of the import graph until something actually needs them.
+LAZY_MODULES = ("alembic", "sqlalchemy.ext.asyncio", "psycopg")
+
+_SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so nothing is already imported.
+_CHILD = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+created = time.perf_counter()
+
+async def first_request():
+    status = []
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+             "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"", "headers": [],
+             "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80)}
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+    await main.app(scope, receive, send)
+    return status[0]
+
+status = asyncio.run(first_request())
+served = time.perf_counter()
+from conf import db
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "first_request_status": status,
+    "engine_created": "engine" in vars(db),
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+@dataclass
+class StartupProfile:
+    import_ms: float
+    create_app_ms: float
+    first_request_ms: float
+    first_request_status: int
+    engine_created: bool
+    modules: list[str]
+    imports: list[tuple[str, float]]
+
+    @property
+    def time_to_first_request_ms(self) -> float:
+        return self.import_ms + self.first_request_ms
+
+    def loaded(self, name: str) -> bool:
+        return name in self.modules
+
+
+def _parse_importtime(stderr: str) -> list[tuple[str, float]]:
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return imports
+
+
+def profile_startup(env: Optional[dict[str, str]] = None) -> StartupProfile:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD],
+        cwd=_SRC,
+        env={**os.environ, "PYTHONPATH": _SRC, **(env or {})},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return StartupProfile(**json.loads(out.stdout.strip().splitlines()[-1]), imports=_parse_importtime(out.stderr))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m conf.startup", description="Profile app import and time to first request.")
+    parser.add_argument("--top", type=int, default=25, help="slowest modules to list by cumulative import time")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args(argv)
+
+    profile = profile_startup()
+    print(f"{'cumulative ms':>14}  module")
+    for name, ms in sorted(profile.imports, key=lambda item: item[1], reverse=True)[: args.top]:
+        print(f"{ms:>14.1f}  {name}")
+    print()
+    print(f"import main:          {profile.import_ms:8.1f} ms (includes module-level create_app)")
+    print(f"create_app():         {profile.create_app_ms:8.1f} ms")
+    print(f"first request:        {profile.first_request_ms:8.1f} ms (status {profile.first_request_status})")
+    print(f"time to first request:{profile.time_to_first_request_ms:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+    eager = [name for name in LAZY_MODULES if profile.loaded(name)]
+    if eager:
+        print(f"eagerly imported:     {', '.join(eager)}")
+    return 0 if profile.time_to_first_request_ms <= args.budget_ms and not eager else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,43 @@
+from typing import Any
+
+from fastapi import APIRouter, Response
+from fastapi.responses import PlainTextResponse
+
+from common import metrics
+from conf import db
+from middleware import auth
+from user import model
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+metrics_router = APIRouter(tags=["internal"])
+well_known_router = APIRouter(prefix="/.well-known", tags=["internal"])
+
+
+# Pool and cache internals are for operators: admin token required. Only
+# /metrics and the JWKS document are served without credentials.
+@router.get("/db/pool")
+async def db_pool(current_user: auth.AdminUser) -> dict[str, Any]:
+    return db.get_pool_stats()
+
+
+@router.get("/cache/user")
+async def user_cache(current_user: auth.AdminUser) -> dict[str, Any]:
+    return model.user_cache.info()
+
+
+@router.get("/cache/token")
+async def token_cache(current_user: auth.AdminUser) -> dict[str, Any]:
+    return auth.token_cache.info()
+
+
+@auth.exempt
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@auth.exempt
+@well_known_router.get("/jwks.json")
+async def jwks(response: Response) -> dict[str, Any]:
+    response.headers["Cache-Control"] = f"public, max-age={int(auth.JWT_KEYRING_RELOAD_SECONDS)}"
+    return auth.jwks()
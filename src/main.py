@@ -2,8 +2,14 @@ from contextlib import asynccontextmanager
 
 from fastapi import APIRouter, FastAPI
 
-from conf.db import close_db, init_db
+from common.response import FastJSONResponse
+from conf.db import close_async_db, close_db, init_db
+from internal.handler import metrics_router, router as internal_router, well_known_router
+from middleware.admission import setup_admission_middleware
 from middleware.auth import setup_jwt_middleware
+from middleware.metrics import setup_metrics_middleware
+from middleware.profiling import setup_profiling_middleware
+from user import password
 from user.handler import router as user_router
 
 
@@ -12,6 +18,8 @@ async def lifespan(_app: FastAPI):
     init_db()
     yield
     close_db()
+    await close_async_db()
+    password.shutdown()
 
 
 def init_routers(_app: FastAPI) -> None:
@@ -23,10 +31,16 @@ def init_routers(_app: FastAPI) -> None:
 
     _app.include_router(root_router)
     _app.include_router(user_router)
+    _app.include_router(internal_router)
+    _app.include_router(metrics_router)
+    _app.include_router(well_known_router)
 
 
 def init_middlewares(_app: FastAPI) -> None:
+    setup_profiling_middleware(_app)
     setup_jwt_middleware(_app)
+    setup_admission_middleware(_app)
+    setup_metrics_middleware(_app)
 
 
 def create_app() -> FastAPI:
@@ -35,6 +49,7 @@ def create_app() -> FastAPI:
         description="A FastAPI demo initialized by UV",
         version="1.0.0",
         lifespan=lifespan,
+        default_response_class=FastJSONResponse,
     )
 
     init_routers(_app)
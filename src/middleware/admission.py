@@ -0,0 +1,223 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Sequence
+
+from fastapi import FastAPI
+from starlette.routing import BaseRoute
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from common import metrics
+from conf.config import (
+    ADMISSION_ADAPTIVE,
+    ADMISSION_DEFAULT_LIMIT,
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_LIMIT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_MIN_LIMIT,
+    ADMISSION_QUEUE_TIMEOUT_MS,
+    ADMISSION_ROUTE_LIMITS,
+    ADMISSION_TARGET_LATENCY_MS,
+)
+from middleware.metrics import UNMATCHED_ROUTE, route_template
+
+_SETUP_ATTR = "__admission_middleware_installed__"
+EXEMPT_PREFIXES = ("/metrics", "/internal/", "/.well-known/")
+
+_limiters: dict[str, "ConcurrencyLimiter"] = {}
+
+ADMISSION_SHED = metrics.counter(
+    "admission_shed_total", "Requests rejected with 503 by admission control.", ("route", "reason")
+)
+ADMISSION_WAIT = metrics.histogram("admission_queue_wait_seconds", "Time admitted requests spent queued.", ("route",))
+metrics.gauge(
+    "admission_in_flight",
+    "Requests currently admitted per route.",
+    ("route",),
+    callback=lambda: {(name,): limiter.in_flight for name, limiter in _limiters.items()},
+)
+metrics.gauge(
+    "admission_queue_depth",
+    "Requests waiting for admission per route.",
+    ("route",),
+    callback=lambda: {(name,): len(limiter.waiters) for name, limiter in _limiters.items()},
+)
+metrics.gauge(
+    "admission_limit",
+    "Current concurrency limit per route.",
+    ("route",),
+    callback=lambda: {(name,): limiter.limit for name, limiter in _limiters.items()},
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, reason: str) -> None:
+        self.reason = reason
+        super().__init__(reason)
+
+
+def parse_route_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for item in spec.split(","):
+        route, _, limit = item.rpartition("=")
+        if route.strip():
+            limits[route.strip()] = int(limit)
+    return limits
+
+
+# A concurrency limit with a bounded FIFO queue. A request is shed immediately
+# when the queue is full or when its expected wait (queue position x mean
+# service time / limit) already exceeds its deadline, and after the deadline
+# otherwise. With adaptive=True the limit follows AIMD on observed latency:
+# +1/limit per on-target completion, x0.9 (at most once per target interval)
+# when latency exceeds the target.
+class ConcurrencyLimiter:
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int,
+        timeout: float,
+        *,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        target_latency: float = 0.25,
+    ) -> None:
+        self._limit = float(limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max_limit or limit
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        self.mean_latency = 0.0
+        self._last_decrease = 0.0
+
+    @property
+    def limit(self) -> int:
+        return max(int(self._limit), self.min_limit)
+
+    def _expected_wait(self) -> float:
+        return (len(self.waiters) + 1) * self.mean_latency / self.limit
+
+    async def acquire(self) -> float:
+        if self.in_flight < self.limit and not self.waiters:
+            self.in_flight += 1
+            return 0.0
+        if len(self.waiters) >= self.max_queue:
+            raise Overloaded("queue_full")
+        if self._expected_wait() > self.timeout:
+            raise Overloaded("deadline")
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot at the same moment we gave up on it; give it back.
+                self.release(None)
+            if isinstance(e, asyncio.TimeoutError):
+                raise Overloaded("timeout") from None
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self.waiters.remove(waiter)
+            except ValueError:
+                pass
+        return time.perf_counter() - start
+
+    def release(self, latency: Optional[float]) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency)
+        while self.waiters and self.in_flight < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, latency: float) -> None:
+        self.mean_latency = latency if self.mean_latency == 0 else 0.9 * self.mean_latency + 0.1 * latency
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if latency > self.target_latency:
+            if now - self._last_decrease >= self.target_latency:
+                self._limit = max(float(self.min_limit), self._limit * 0.9)
+                self._last_decrease = now
+        else:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+
+def _limiter(name: str, route_limits: dict[str, int]) -> "ConcurrencyLimiter":
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limit = route_limits.get(name, ADMISSION_DEFAULT_LIMIT)
+        limiter = _limiters[name] = ConcurrencyLimiter(
+            limit,
+            ADMISSION_MAX_QUEUE,
+            ADMISSION_QUEUE_TIMEOUT_MS / 1000,
+            adaptive=ADMISSION_ADAPTIVE,
+            min_limit=ADMISSION_MIN_LIMIT,
+            max_limit=max(ADMISSION_MAX_LIMIT, limit),
+            target_latency=ADMISSION_TARGET_LATENCY_MS / 1000,
+        )
+    return limiter
+
+
+async def _shed(send: Send) -> None:
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", b"1")],
+        }
+    )
+    await send({"type": "http.response.body", "body": b'{"detail":"Service overloaded"}'})
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute] = (), route_limits: Optional[dict[str, int]] = None):
+        self.app = app
+        self.routes = routes
+        self.route_limits = route_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        template = route_template(scope, self.routes)
+        if template == UNMATCHED_ROUTE:
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']} {template}"
+        limiter = _limiter(name, self.route_limits)
+        try:
+            waited = await limiter.acquire()
+        except Overloaded as e:
+            ADMISSION_SHED.inc(route=name, reason=e.reason)
+            await _shed(send)
+            return
+
+        ADMISSION_WAIT.observe(waited, route=name)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+
+def setup_admission_middleware(app: FastAPI) -> None:
+    if not ADMISSION_ENABLED or getattr(app, _SETUP_ATTR, False):
+        return
+    setattr(app, _SETUP_ATTR, True)
+    app.add_middleware(
+        AdmissionMiddleware, routes=app.router.routes, route_limits=parse_route_limits(ADMISSION_ROUTE_LIMITS)
+    )
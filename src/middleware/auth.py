@@ -1,14 +1,33 @@
+import hashlib
+import heapq
+import threading
 import time
+from dataclasses import dataclass
 from functools import lru_cache
-from typing import Any, Callable, Dict, TypeVar
+from typing import Annotated, Any, Callable, Dict, Mapping, Optional, TypeVar
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
-from jwt import PyJWT, PyJWTError
+from jwt import InvalidKeyError, PyJWT, PyJWTError, get_unverified_header
+from starlette.types import ASGIApp, Receive, Scope, Send
 
-from common import erri
-from conf.config import JWT_ALGORITHM, JWT_EXPIRE_SECONDS, JWT_SECRET
+from common import erri, metrics
+from common.cache import Cache, LRUCache, NullCache
+from conf.config import (
+    JWT_ALGORITHM,
+    JWT_CACHE_SIZE,
+    JWT_EXPIRE_SECONDS,
+    JWT_KEYRING_DIR,
+    JWT_KEYRING_RELOAD_SECONDS,
+    JWT_MAX_TOKEN_BYTES,
+    JWT_PROFILE_CLAIMS,
+    JWT_PROFILE_MAX_AGE_SECONDS,
+    JWT_REVOCATION_MAX_ENTRIES,
+    JWT_SECRET,
+    JWT_SIGNING_KID,
+)
+from middleware.keyring import Keyring
 from user.model import User
 
 
@@ -17,6 +36,108 @@ def _jwt() -> PyJWT:
     return PyJWT()
 
 
+@lru_cache(maxsize=1)
+def _keyring() -> Optional[Keyring]:
+    if not JWT_KEYRING_DIR:
+        return None
+    return Keyring(JWT_KEYRING_DIR, JWT_SIGNING_KID, JWT_KEYRING_RELOAD_SECONDS)
+
+
+class RevocationListFull(Exception):
+    pass
+
+
+# Revoked token hashes are kept until the token's own exp and never evicted
+# earlier: forgetting a revocation would make the token valid again. Entries
+# are pruned in exp order; when the list is full of live entries, add() raises
+# rather than dropping one.
+class RevocationList:
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._expires: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires_at: float) -> None:
+        with self._lock:
+            self._prune(time.time())
+            if key not in self._expires and len(self._expires) >= self.max_entries:
+                raise RevocationListFull(f"{len(self._expires)} live revocations")
+            self._expires[key] = max(expires_at, self._expires.get(key, 0.0))
+            heapq.heappush(self._heap, (self._expires[key], key))
+
+    def __contains__(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        return expires_at is not None and expires_at > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def _prune(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == expires_at:
+                del self._expires[key]
+
+
+token_cache: Cache = LRUCache(maxsize=JWT_CACHE_SIZE, ttl=JWT_EXPIRE_SECONDS) if JWT_CACHE_SIZE > 0 else NullCache()
+_revoked_tokens = RevocationList(JWT_REVOCATION_MAX_ENTRIES)
+
+@dataclass(frozen=True, slots=True)
+class ProfileClaims:
+    nickname: Optional[str]
+    email: Optional[str]
+    avatar_url: Optional[str]
+    is_active: bool
+    version: int
+
+    @classmethod
+    def from_claims(cls, claims: Any) -> Optional["ProfileClaims"]:
+        if not isinstance(claims, Mapping):
+            return None
+        return cls(
+            nickname=claims.get("nickname"),
+            email=claims.get("email"),
+            avatar_url=claims.get("avatar_url"),
+            is_active=bool(claims.get("is_active", True)),
+            version=int(claims.get("ver", 0)),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    subject: str
+    issued_at: int
+    expires_at: int
+    role: str
+    user_id: Optional[int]
+    profile: Optional[ProfileClaims] = None
+
+    @classmethod
+    def from_claims(cls, claims: Mapping[str, Any]) -> "Principal":
+        sub = claims.get("sub")
+        if not isinstance(sub, str) or not sub:
+            raise erri.unauthorized("Unauthorized")
+        uid = claims.get("uid")
+        return cls(
+            subject=sub,
+            issued_at=int(claims.get("iat", 0)),
+            expires_at=int(claims.get("exp", 0)),
+            role=str(claims.get("role", "user")),
+            user_id=uid if isinstance(uid, int) else None,
+            profile=ProfileClaims.from_claims(claims.get("profile")),
+        )
+
+    def fresh_profile(self) -> Optional[ProfileClaims]:
+        if self.profile is None or time.time() - self.issued_at > JWT_PROFILE_MAX_AGE_SECONDS:
+            return None
+        return self.profile
+
+
+TOKEN_VERIFY_SECONDS = metrics.histogram(
+    "auth_token_verify_seconds", "JWT verification time by token cache outcome.", ("cache",)
+)
+
 EXEMPT_PATHS: set[str] = set()
 _EXEMPT_ENDPOINT_ATTR = "__jwt_exempt__"
 _ROUTES_FROZEN_ATTR = "__jwt_routes_frozen__"
@@ -57,59 +178,207 @@ def _freeze_route_registration(app: FastAPI) -> None:
     app.router.add_api_route = _blocked
 
 
+def _profile_claims(user: User) -> Dict[str, Any]:
+    return {
+        "nickname": user.nickname,
+        "email": user.email,
+        "avatar_url": user.avatar_url,
+        "is_active": user.is_active,
+        "ver": int(user.updated_at.timestamp() * 1000),
+    }
+
+
 def create_token(user: User) -> str:
     now = int(time.time())
-    payload = {"sub": user.username, "iat": now, "exp": now + JWT_EXPIRE_SECONDS}
-    return _jwt().encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    payload = {
+        "sub": user.username,
+        "iat": now,
+        "exp": now + JWT_EXPIRE_SECONDS,
+        "uid": user.id,
+        "role": user.role,
+    }
+    if JWT_PROFILE_CLAIMS:
+        token = _encode({**payload, "profile": _profile_claims(user)})
+        if len(token) <= JWT_MAX_TOKEN_BYTES:
+            return token
+    return _encode(payload)
+
+
+def _encode(payload: Dict[str, Any]) -> str:
+    keyring = _keyring()
+    if keyring is None:
+        return _jwt().encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    entry = keyring.signing_entry()
+    return _jwt().encode(payload, entry.signing_key, algorithm=entry.algorithm, headers={"kid": entry.kid})
+
+
+# With a keyring the algorithm is pinned by the kid's key type, never taken
+# from the token header, so an HS256 token cannot be forged with a public key.
+def _decode(token: str) -> Dict[str, Any]:
+    keyring = _keyring()
+    if keyring is None:
+        return _jwt().decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    kid = get_unverified_header(token).get("kid")
+    entry = keyring.get(kid) if isinstance(kid, str) else None
+    if entry is None:
+        raise InvalidKeyError(f"Unknown kid {kid!r}")
+    return _jwt().decode(token, entry.verify_key, algorithms=[entry.algorithm])
+
+
+def _kid(token: str) -> Optional[str]:
+    if _keyring() is None:
+        return None
+    kid = get_unverified_header(token).get("kid")
+    return kid if isinstance(kid, str) else None
+
+
+# A cached verification is only as good as the key that produced it: once a kid
+# leaves the keyring, tokens it signed stop verifying even from the cache.
+def _trusted(kid: Optional[str]) -> bool:
+    keyring = _keyring()
+    return keyring is None or (kid is not None and keyring.get(kid) is not None)
+
+
+def jwks() -> Dict[str, Any]:
+    keyring = _keyring()
+    return keyring.jwks() if keyring is not None else {"keys": []}
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _seconds_left(payload: Dict[str, Any]) -> float:
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)):
+        return 0.0
+    return exp - time.time()
 
 
 def verify_token(token: str) -> Dict[str, Any]:
+    start = time.perf_counter()
+    key = _token_key(token)
+    if key in _revoked_tokens:
+        raise erri.unauthorized("Invalid token")
+
+    cached = token_cache.get(key)
+    if cached is not None:
+        if _seconds_left(cached["claims"]) > 0 and _trusted(cached["kid"]):
+            TOKEN_VERIFY_SECONDS.observe(time.perf_counter() - start, cache="hit")
+            return dict(cached["claims"])
+        token_cache.delete(key)
+
     try:
-        decoded = _jwt().decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return decoded
+        decoded = _decode(token)
+        kid = _kid(token)
     except PyJWTError:
         raise erri.unauthorized("Invalid token")
+    finally:
+        TOKEN_VERIFY_SECONDS.observe(time.perf_counter() - start, cache="miss")
 
+    ttl = _seconds_left(decoded)
+    if ttl > 0:
+        token_cache.set(key, {"claims": dict(decoded), "kid": kid}, ttl=ttl)
+    return decoded
+
+
+def revoke_token(token: str) -> None:
+    key = _token_key(token)
+    token_cache.delete(key)
+    try:
+        payload = _decode(token)
+    except PyJWTError:
+        return
+    if _seconds_left(payload) > 0:
+        try:
+            _revoked_tokens.add(key, payload["exp"])
+        except RevocationListFull:
+            raise erri.service_unavailable("Token revocation list is full")
 
-def get_username(request: Request) -> str:
-    state_user = getattr(request.state, "user", None)
-    if isinstance(state_user, str) and state_user:
-        return state_user
+
+def get_principal(request: Request) -> Principal:
+    principal = getattr(request.state, "principal", None)
+    if isinstance(principal, Principal):
+        return principal
 
     authorization = request.headers.get("Authorization")
     if authorization and authorization.startswith("Bearer "):
         token = authorization.split(" ", 1)[1]
-        payload = verify_token(token)
-        sub = payload.get("sub")
-        if isinstance(sub, str) and sub:
-            return sub
+        principal = Principal.from_claims(verify_token(token))
+        request.state.principal = principal
+        request.state.user = principal.subject
+        return principal
 
     raise erri.unauthorized("Unauthorized")
 
 
-def setup_jwt_middleware(app: FastAPI):
-    if getattr(app, _SETUP_ATTR, False):
-        return
+def get_username(request: Request) -> str:
+    return get_principal(request).subject
+
+
+def get_current_user(request: Request) -> Principal:
+    try:
+        return get_principal(request)
+    except erri.BusinessError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    EXEMPT_PATHS.update(_build_exempt_paths(app))
-    _freeze_route_registration(app)
-    setattr(app, _SETUP_ATTR, True)
 
-    @app.middleware("http")
-    async def jwt_middleware(request: Request, call_next):
-        path = request.url.path
-        if path in EXEMPT_PATHS:
-            return await call_next(request)
+CurrentUser = Annotated[Principal, Depends(get_current_user)]
 
-        auth = request.headers.get("Authorization")
+
+def require_admin(current_user: CurrentUser) -> Principal:
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Forbidden")
+    return current_user
+
+
+AdminUser = Annotated[Principal, Depends(require_admin)]
+
+
+def _authorization_header(scope: Scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            return value.decode("latin-1")
+    return None
+
+
+class JWTMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        auth = _authorization_header(scope)
         if not auth or not auth.startswith("Bearer "):
-            return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+            response = JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+            await response(scope, receive, send)
+            return
         token = auth.split(" ", 1)[1]
         try:
-            payload = verify_token(token)
+            principal = Principal.from_claims(verify_token(token))
         except erri.BusinessError as e:
-            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            await response(scope, receive, send)
+            return
         except HTTPException as e:
-            return JSONResponse(status_code=e.status_code, content={"detail": e.detail})
-        request.state.user = payload.get("sub")
-        return await call_next(request)
+            response = JSONResponse(status_code=e.status_code, content={"detail": e.detail})
+            await response(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+        state["principal"] = principal
+        state["user"] = principal.subject
+        await self.app(scope, receive, send)
+
+
+def setup_jwt_middleware(app: FastAPI):
+    if getattr(app, _SETUP_ATTR, False):
+        return
+
+    EXEMPT_PATHS.update(_build_exempt_paths(app))
+    _freeze_route_registration(app)
+    setattr(app, _SETUP_ATTR, True)
+
+    app.add_middleware(JWTMiddleware)
@@ -0,0 +1,189 @@
+import argparse
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from common import erri
+
+ALGORITHMS = ("EdDSA", "ES256", "RS256")
+_PRIVATE_SUFFIX = ".pem"
+_PUBLIC_SUFFIX = ".pub.pem"
+
+logger = logging.getLogger(__name__)
+
+
+def _crypto():
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+    except ImportError as e:
+        raise RuntimeError(f"asymmetric JWT keys require the 'cryptography' package: {e}")
+    return serialization, ec, ed25519, rsa
+
+
+def _algorithm(public_key: Any) -> str:
+    _, ec, ed25519, rsa = _crypto()
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return "EdDSA"
+    if isinstance(public_key, ec.EllipticCurvePublicKey) and isinstance(public_key.curve, ec.SECP256R1):
+        return "ES256"
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return "RS256"
+    raise ValueError(f"unsupported JWT key type: {type(public_key).__name__}")
+
+
+@dataclass(frozen=True, slots=True)
+class KeyEntry:
+    kid: str
+    algorithm: str
+    verify_key: Any
+    signing_key: Optional[Any] = None
+
+    def jwk(self) -> dict[str, Any]:
+        from jwt.algorithms import ECAlgorithm, OKPAlgorithm, RSAAlgorithm
+
+        encoder = {"EdDSA": OKPAlgorithm, "ES256": ECAlgorithm, "RS256": RSAAlgorithm}[self.algorithm]
+        return {**encoder.to_jwk(self.verify_key, as_dict=True), "kid": self.kid, "alg": self.algorithm, "use": "sig"}
+
+
+def _load_entry(kid: str, data: bytes, private: bool) -> KeyEntry:
+    serialization, *_ = _crypto()
+    if private:
+        signing_key = serialization.load_pem_private_key(data, password=None)
+        verify_key = signing_key.public_key()
+    else:
+        signing_key = None
+        verify_key = serialization.load_pem_public_key(data)
+    return KeyEntry(kid=kid, algorithm=_algorithm(verify_key), verify_key=verify_key, signing_key=signing_key)
+
+
+# PEM files are parsed once into key objects and kept by kid; PyJWT accepts the
+# objects directly, so a verify never touches the PEM again. A kid is trusted
+# only while its <kid>.pub.pem exists: the directory is rescanned every
+# reload_seconds (and on an unknown kid, at most that often), so deleting a
+# compromised key's files revokes it on every running verifier. A file that
+# fails to load is logged and skipped (keeping its previous key, if any), and a
+# scan that fails or finds no keys at all (e.g. an unmounted volume) is
+# discarded, so a bad deploy to the key directory can't take down every verify.
+class Keyring:
+    def __init__(self, directory: str | Path, signing_kid: str = "", reload_seconds: float = 60) -> None:
+        self.directory = Path(directory)
+        self.signing_kid = signing_kid
+        self.reload_seconds = reload_seconds
+        self._entries: dict[str, KeyEntry] = {}
+        self._stamps: dict[str, tuple[int, int]] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def _scan(self) -> tuple[dict[str, KeyEntry], dict[str, tuple[int, int]]]:
+        entries: dict[str, KeyEntry] = {}
+        stamps: dict[str, tuple[int, int]] = {}
+        for path in sorted(self.directory.glob(f"*{_PUBLIC_SUFFIX}")):
+            kid = path.name[: -len(_PUBLIC_SUFFIX)]
+            private = self.directory / f"{kid}{_PRIVATE_SUFFIX}"
+            cached = self._entries.get(kid)
+            try:
+                source = private if private.exists() else path
+                stat = source.stat()
+                stamp = (stat.st_mtime_ns, stat.st_size)
+                if cached is not None and self._stamps.get(kid) == stamp:
+                    entries[kid] = cached
+                else:
+                    entries[kid] = _load_entry(kid, source.read_bytes(), private=source is private)
+                stamps[kid] = stamp
+            except Exception:
+                logger.exception("skipping JWT key %s", kid)
+                if cached is not None:
+                    # No stamp, so the file is retried on the next scan.
+                    entries[kid] = cached
+        return entries, stamps
+
+    def reload(self) -> None:
+        with self._reload_lock:
+            self._reload()
+
+    def _reload(self) -> None:
+        try:
+            entries, stamps = self._scan()
+            if not entries and self._entries:
+                logger.error("no usable JWT keys in %s; keeping the previous keys", self.directory)
+                return
+            with self._lock:
+                self._entries = entries
+                self._stamps = stamps
+        except Exception:
+            if not self._entries:
+                raise
+            logger.exception("scanning JWT keys in %s failed; keeping the previous keys", self.directory)
+        finally:
+            self._loaded_at = time.monotonic()
+
+    def _stale(self) -> bool:
+        return time.monotonic() - self._loaded_at >= self.reload_seconds
+
+    def _refresh(self) -> None:
+        # One caller rescans; the others keep using the current keys instead of queueing behind it.
+        if self._stale() and self._reload_lock.acquire(blocking=False):
+            try:
+                if self._stale():
+                    self._reload()
+            finally:
+                self._reload_lock.release()
+
+    def get(self, kid: str) -> Optional[KeyEntry]:
+        self._refresh()
+        return self._entries.get(kid)
+
+    def signing_entry(self) -> KeyEntry:
+        self._refresh()
+        entry = self._entries.get(self.signing_kid) if self.signing_kid else None
+        if entry is None or entry.signing_key is None:
+            raise erri.internal(f"No private key for signing kid {self.signing_kid!r}")
+        return entry
+
+    def jwks(self) -> dict[str, list[dict[str, Any]]]:
+        self._refresh()
+        return {"keys": [entry.jwk() for _, entry in sorted(self._entries.items())]}
+
+
+def generate_key(directory: str | Path, kid: str, algorithm: str) -> Path:
+    serialization, ec, ed25519, rsa = _crypto()
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        raise ValueError(f"unsupported algorithm {algorithm!r}; expected one of {ALGORITHMS}")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    private_path = directory / f"{kid}{_PRIVATE_SUFFIX}"
+    private_path.write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    )
+    private_path.chmod(0o600)
+    (directory / f"{kid}{_PUBLIC_SUFFIX}").write_bytes(
+        key.public_key().public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    )
+    return private_path
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m middleware.keyring", description="Generate a JWT signing key pair.")
+    parser.add_argument("kid", help="key id; files are written as <kid>.pem and <kid>.pub.pem")
+    parser.add_argument("--alg", choices=ALGORITHMS, default="EdDSA")
+    parser.add_argument("--dir", default="keys")
+    args = parser.parse_args(argv)
+    print(generate_key(args.dir, args.kid, args.alg))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,71 @@
+import time
+from typing import Sequence
+
+from fastapi import FastAPI
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from common import metrics
+from conf.config import METRICS_ENABLED
+
+_SETUP_ATTR = "__metrics_middleware_installed__"
+_KNOWN_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"})
+UNMATCHED_ROUTE = "<unmatched>"
+
+HTTP_REQUESTS = metrics.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+HTTP_IN_FLIGHT = metrics.gauge("http_requests_in_flight", "HTTP requests currently being served.")
+
+
+def route_template(scope: Scope, routes: Sequence[BaseRoute]) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if isinstance(path, str):
+        return path
+    for candidate in routes:
+        match, _ = candidate.matches(scope)
+        if match == Match.FULL:
+            return getattr(candidate, "path", UNMATCHED_ROUTE)
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute] = ()):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            HTTP_IN_FLIGHT.dec()
+            method = scope["method"] if scope["method"] in _KNOWN_METHODS else "OTHER"
+            route = route_template(scope, self.routes)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+            HTTP_LATENCY.observe(elapsed, method=method, route=route)
+
+
+def setup_metrics_middleware(app: FastAPI) -> None:
+    if not METRICS_ENABLED or getattr(app, _SETUP_ATTR, False):
+        return
+    setattr(app, _SETUP_ATTR, True)
+    app.add_middleware(MetricsMiddleware, routes=app.router.routes)
@@ -0,0 +1,304 @@
+import functools
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Optional, TypeVar
+
+from anyio import to_thread
+from fastapi import FastAPI
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from conf import db
+from conf.config import (
+    PROFILING_ALLOWED_SUBJECTS,
+    PROFILING_ENABLED,
+    PROFILING_FORMAT,
+    PROFILING_HEADER,
+    PROFILING_INTERVAL_MS,
+    PROFILING_MAX_FILES,
+    PROFILING_OUTPUT_DIR,
+    PROFILING_SAMPLE_RATE,
+)
+
+_SETUP_ATTR = "__profiling_middleware_installed__"
+_SQL_START_KEY = "_profiling_start"
+
+T = TypeVar("T")
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _stack(frame: Optional[FrameType]) -> tuple[str, ...]:
+    names: list[str] = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+# Samples only the threads serving the profiled request: the event loop thread
+# it started on (shared with whatever else the loop is running at the time), and
+# worker threads while they run its code, entered through run_in_threadpool /
+# bind_thread below or running one of its SQL statements.
+class StackSampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter[tuple[str, ...]] = Counter()
+        self._threads: Counter[int] = Counter()
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def track(self) -> None:
+        with self._threads_lock:
+            self._threads[threading.get_ident()] += 1
+
+    def untrack(self) -> None:
+        ident = threading.get_ident()
+        with self._threads_lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._threads_lock:
+                idents = list(self._threads)
+            frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    thread = names.get(ident) or f"thread-{ident}"
+                    self.samples[(thread, *_stack(frame))] += 1
+
+
+class RequestProfile:
+    def __init__(self, scope: Scope, reason: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.reason = reason
+        self.status: Optional[int] = None
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.sql: list[dict[str, Any]] = []
+        self.sampler = StackSampler(PROFILING_INTERVAL_MS / 1000)
+
+    def record_sql(self, statement: str, duration: float) -> None:
+        self.sql.append({"statement": statement, "duration_ms": round(duration * 1000, 3)})
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self.sampler.samples.items())
+
+    def speedscope(self) -> dict[str, Any]:
+        frames: dict[str, int] = {}
+        samples: list[list[int]] = []
+        weights: list[float] = []
+        for stack, count in self.sampler.samples.items():
+            samples.append([frames.setdefault(name, len(frames)) for name in stack])
+            weights.append(count * self.sampler.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "shared": {"frames": [{"name": name} for name in frames]},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": f"{self.method} {self.path}",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": self.duration,
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def metadata(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": sum(self.sampler.samples.values()),
+            "sql": self.sql,
+        }
+
+
+class ProfileRing:
+    def __init__(self, directory: str, max_files: int, fmt: str):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self.format = fmt
+
+    def write(self, profile: RequestProfile) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{int(profile.started_at * 1000)}-{profile.id}"
+        if self.format == "speedscope":
+            path = self.directory / f"{stem}.speedscope.json"
+            path.write_text(json.dumps(profile.speedscope()), encoding="utf-8")
+        else:
+            path = self.directory / f"{stem}.collapsed"
+            path.write_text(profile.collapsed(), encoding="utf-8")
+        (self.directory / f"{stem}.meta.json").write_text(json.dumps(profile.metadata()), encoding="utf-8")
+        self._trim()
+        return path
+
+    def _trim(self) -> None:
+        profiles = sorted(p for p in self.directory.iterdir() if not p.name.endswith(".meta.json"))
+        for stale in profiles[: max(0, len(profiles) - self.max_files)]:
+            stem = stale.name.split(".", 1)[0]
+            stale.unlink(missing_ok=True)
+            (self.directory / f"{stem}.meta.json").unlink(missing_ok=True)
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def bind_thread(fn: Callable[..., T]) -> Callable[..., T]:
+    # Call in the request's context; the returned callable registers whichever
+    # thread runs it with the request's profile for the duration of the call.
+    profile = _current_profile.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args: Any, **kwargs: Any) -> T:
+        profile.sampler.track()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.sampler.untrack()
+
+    return run
+
+
+async def run_in_threadpool(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await to_thread.run_sync(functools.partial(bind_thread(fn), *args, **kwargs))
+
+
+def _on_before_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.sampler.track()
+        conn.info.setdefault(_SQL_START_KEY, []).append(time.perf_counter())
+
+
+def _on_after_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _current_profile.get()
+    starts = conn.info.get(_SQL_START_KEY)
+    if profile is not None and starts:
+        profile.record_sql(statement, time.perf_counter() - starts.pop())
+        profile.sampler.untrack()
+
+
+def _on_error(context) -> None:
+    profile = _current_profile.get()
+    starts = context.connection.info.get(_SQL_START_KEY) if context.connection is not None else None
+    if profile is not None and starts:
+        starts.pop()
+        profile.sampler.untrack()
+
+
+def instrument_engine(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _on_before_execute):
+        event.listen(engine, "before_cursor_execute", _on_before_execute)
+        event.listen(engine, "after_cursor_execute", _on_after_execute)
+        event.listen(engine, "handle_error", _on_error)
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        *,
+        sample_rate: float = PROFILING_SAMPLE_RATE,
+        header: str = PROFILING_HEADER,
+        allowed_subjects: frozenset[str] = PROFILING_ALLOWED_SUBJECTS,
+        ring: Optional[ProfileRing] = None,
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.allowed_subjects = allowed_subjects
+        self.ring = ring or ProfileRing(PROFILING_OUTPUT_DIR, PROFILING_MAX_FILES, PROFILING_FORMAT)
+        self._busy = threading.Lock()
+
+    def _reason(self, scope: Scope) -> Optional[str]:
+        flag = _header(scope, self.header)
+        if flag is not None and flag not in (b"", b"0", b"false"):
+            principal = scope.get("state", {}).get("principal")
+            if principal is not None and principal.subject in self.allowed_subjects:
+                return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        reason = self._reason(scope)
+        if reason is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope, reason)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        start = time.perf_counter()
+        profile.sampler.track()
+        profile.sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.sampler.stop()
+            profile.duration = time.perf_counter() - start
+            _current_profile.reset(token)
+            self._busy.release()
+            await to_thread.run_sync(self.ring.write, profile)
+
+
+def setup_profiling_middleware(app: FastAPI) -> None:
+    if not PROFILING_ENABLED or getattr(app, _SETUP_ATTR, False):
+        return
+    setattr(app, _SETUP_ATTR, True)
+    instrument_engine(db.engine)
+    if db.async_engine is not None:
+        instrument_engine(db.async_engine.sync_engine)
+    app.add_middleware(ProfilingMiddleware)
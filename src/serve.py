@@ -0,0 +1,170 @@
+import argparse
+import gc
+import importlib.util
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Optional
+
+import uvicorn
+
+from conf import config as settings
+from conf.config import (
+    SERVE_BACKLOG,
+    SERVE_GRACEFUL_TIMEOUT_SECONDS,
+    SERVE_HOST,
+    SERVE_KEEPALIVE_SECONDS,
+    SERVE_PORT,
+    SERVE_PRELOAD,
+    SERVE_WORKERS,
+    USER_CACHE_BACKEND,
+    USER_CACHE_TTL_SECONDS,
+)
+
+logger = logging.getLogger("serve")
+
+APP = "main:app"
+# A worker that dies sooner than this after starting is crash-looping; back off before respawning it.
+_MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def user_cache_backend(workers: int) -> str:
+    # Each worker would keep its own copy of the memory cache and only drop
+    # entries for writes it handled itself, so don't default to it when forking.
+    if workers > 1 and USER_CACHE_BACKEND == "memory" and not os.getenv("USER_CACHE_BACKEND"):
+        return "none"
+    return USER_CACHE_BACKEND
+
+
+def build_config(host: str, port: int, backlog: int, keepalive: int, graceful_timeout: int, preload: bool) -> uvicorn.Config:
+    app = APP
+    if preload:
+        import main
+
+        app = main.app
+    return uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        loop=event_loop(),
+        http=http_protocol(),
+        backlog=backlog,
+        timeout_keep_alive=keepalive,
+        timeout_graceful_shutdown=graceful_timeout,
+        lifespan="on",
+    )
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int, graceful_timeout: int) -> None:
+        self.config = config
+        self.workers = max(workers, 1)
+        self.graceful_timeout = graceful_timeout
+        self.children: dict[int, float] = {}
+        self.stopping = False
+
+    def _worker(self, sock) -> None:
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGALRM):
+            signal.signal(sig, signal.SIG_DFL)
+        code = 0
+        try:
+            uvicorn.Server(self.config).run(sockets=[sock])
+        except BaseException:
+            logger.exception("worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+
+    def _spawn(self, sock) -> None:
+        pid = os.fork()
+        if pid == 0:
+            self._worker(sock)
+        self.children[pid] = time.monotonic()
+
+    def _stop(self, signum, _frame) -> None:
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info("received %s, draining %d workers", signal.Signals(signum).name, len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        # uvicorn drains within timeout_graceful_shutdown; kill whatever is left after that.
+        signal.alarm(self.graceful_timeout + 5)
+
+    def _kill(self, _signum, _frame) -> None:
+        for pid in self.children:
+            os.kill(pid, signal.SIGKILL)
+
+    def run(self) -> int:
+        sock = self.config.bind_socket()
+        host, port = sock.getsockname()[:2]
+        logger.info(
+            "listening on http://%s:%d with %d workers (loop=%s, http=%s)",
+            host, port, self.workers, self.config.loop, self.config.http,
+        )
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        signal.signal(signal.SIGALRM, self._kill)
+
+        # Objects created during preload are never collected; freezing them keeps
+        # the collector from writing to their pages and breaking copy-on-write.
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self._spawn(sock)
+
+        failed = False
+        while self.children:
+            pid, status = os.wait()
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                failed = failed or code not in (0, -signal.SIGTERM)
+                continue
+            logger.warning("worker %d exited with %d, respawning", pid, code)
+            if time.monotonic() - started < _MIN_WORKER_LIFETIME_SECONDS:
+                time.sleep(_MIN_WORKER_LIFETIME_SECONDS)
+            if not self.stopping:
+                self._spawn(sock)
+        sock.close()
+        return 1 if failed else 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m serve", description="Pre-forking production server for main:app.")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--backlog", type=int, default=SERVE_BACKLOG)
+    parser.add_argument("--keepalive", type=int, default=SERVE_KEEPALIVE_SECONDS)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVE_GRACEFUL_TIMEOUT_SECONDS)
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=SERVE_PRELOAD)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     [serve] %(message)s", stream=sys.stderr)
+    # Must be settled before main (and so user.model) is imported, here or in the workers.
+    settings.USER_CACHE_BACKEND = user_cache_backend(args.workers)
+    if args.workers > 1 and settings.USER_CACHE_BACKEND == "memory":
+        logger.warning(
+            "USER_CACHE_BACKEND=memory with %d workers: profile updates reach other workers only after %gs",
+            args.workers, USER_CACHE_TTL_SECONDS,
+        )
+    config = build_config(args.host, args.port, args.backlog, args.keepalive, args.graceful_timeout, args.preload)
+    return Supervisor(config, args.workers, args.graceful_timeout).run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel, create_engine
+
+from common.cache import LRUCache
+from conf import db
+from user import model
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch: pytest.MonkeyPatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine, raising=True)
+    yield engine
+    engine.dispose()
+
+
+class StatementLog(list):
+    def selects(self) -> list[str]:
+        return [s for s in self if s.lstrip().upper().startswith("SELECT")]
+
+
+# Every statement sent to sqlite_engine; clear() it once setup is done to count
+# only what the code under test runs.
+@pytest.fixture
+def sql_statements(sqlite_engine) -> StatementLog:
+    statements = StatementLog()
+
+    @event.listens_for(sqlite_engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+@pytest.fixture
+def user_cache(monkeypatch: pytest.MonkeyPatch) -> LRUCache:
+    cache = LRUCache(maxsize=100, ttl=60)
+    monkeypatch.setattr(model, "user_cache", cache, raising=True)
+    return cache
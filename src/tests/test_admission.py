@@ -0,0 +1,158 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from common import metrics
+from middleware import admission
+from middleware.admission import AdmissionMiddleware, ConcurrencyLimiter, Overloaded, parse_route_limits
+
+
+@pytest.fixture(autouse=True)
+def _fresh_limiters(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(admission, "_limiters", {})
+
+
+def test_parse_route_limits():
+    assert parse_route_limits("POST /user/login=16, GET /user/{user_id}=4") == {
+        "POST /user/login": 16,
+        "GET /user/{user_id}": 4,
+    }
+    assert parse_route_limits("") == {}
+
+
+def test_limiter_queues_and_hands_off_in_order():
+    async def main():
+        limiter = ConcurrencyLimiter(1, max_queue=2, timeout=1)
+        assert await limiter.acquire() == 0.0
+
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter("a")), asyncio.create_task(waiter("b"))]
+        await asyncio.sleep(0)
+        assert len(limiter.waiters) == 2
+
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "queue_full"
+
+        limiter.release(0.01)
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert order == ["a"] and limiter.in_flight == 1
+        limiter.release(0.01)
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b"] and limiter.in_flight == 1 and not limiter.waiters
+
+    asyncio.run(main())
+
+
+def test_limiter_sheds_on_deadline():
+    async def main():
+        limiter = ConcurrencyLimiter(1, max_queue=10, timeout=0.05)
+        await limiter.acquire()
+
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "timeout"
+        assert limiter.in_flight == 1 and not limiter.waiters
+
+        # Once service times are known, a hopeless wait is refused without queueing.
+        limiter.mean_latency = 1.0
+        with pytest.raises(Overloaded) as exc:
+            await limiter.acquire()
+        assert exc.value.reason == "deadline"
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def main():
+        limiter = ConcurrencyLimiter(1, max_queue=10, timeout=1)
+        await limiter.acquire()
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(None)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_adaptive_limit_follows_latency():
+    limiter = ConcurrencyLimiter(10, max_queue=0, timeout=1, adaptive=True, min_limit=2, max_limit=12, target_latency=0.1)
+    limiter.in_flight = 100
+
+    limiter.release(0.5)
+    assert limiter.limit == 9
+    # Decreases are spaced by at least one target interval.
+    limiter.release(0.5)
+    assert limiter.limit == 9
+
+    for _ in range(50):
+        limiter.release(0.01)
+    assert limiter.limit == 12
+
+    limiter._limit = 2.0
+    limiter._last_decrease = 0.0
+    limiter.release(0.5)
+    assert limiter.limit == 2
+
+
+def _app(gate: asyncio.Event) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def slow():
+        await gate.wait()
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, routes=app.router.routes, route_limits={"GET /slow": 1})
+    return app
+
+
+def test_middleware_sheds_with_503_and_exports_metrics(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(admission, "ADMISSION_MAX_QUEUE", 1)
+
+    async def main():
+        gate = asyncio.Event()
+        transport = httpx.ASGITransport(app=_app(gate))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(client.get("/slow"))
+            queued = asyncio.create_task(client.get("/slow"))
+            for _ in range(20):
+                await asyncio.sleep(0)
+            limiter = admission._limiters["GET /slow"]
+            assert limiter.in_flight == 1 and len(limiter.waiters) == 1
+
+            rendered = metrics.REGISTRY.render()
+            assert 'admission_queue_depth{route="GET /slow"} 1' in rendered
+            assert 'admission_limit{route="GET /slow"} 1' in rendered
+
+            shed = await client.get("/slow")
+            assert shed.status_code == 503
+            assert shed.headers["retry-after"] == "1"
+            assert shed.json() == {"detail": "Service overloaded"}
+
+            # Other routes have their own limit.
+            assert (await client.get("/fast")).status_code == 200
+
+            gate.set()
+            assert (await first).status_code == 200
+            assert (await queued).status_code == 200
+            assert limiter.in_flight == 0
+
+    before = admission.ADMISSION_SHED.value(route="GET /slow", reason="queue_full")
+    asyncio.run(main())
+    assert admission.ADMISSION_SHED.value(route="GET /slow", reason="queue_full") == before + 1
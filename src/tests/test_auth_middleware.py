@@ -1,6 +1,11 @@
+import dataclasses
+import time
+
 import pytest
 from fastapi import APIRouter, FastAPI, Request
 from fastapi.testclient import TestClient
+from common import erri
+from common.cache import LRUCache, NullCache
 from middleware import auth
 from user import handler as user_handler
 from user.model import User
@@ -204,3 +209,253 @@ def test_user_me_patch_updates_profile(monkeypatch: pytest.MonkeyPatch):
     assert resp.status_code == 200
     assert resp.json()["username"] == "alice"
     assert resp.json()["nickname"] == "NewName"
+
+
+class _CountingJWT:
+    def __init__(self):
+        self.decodes = 0
+        self._inner = auth.PyJWT()
+
+    def decode(self, *args, **kwargs):
+        self.decodes += 1
+        return self._inner.decode(*args, **kwargs)
+
+    def encode(self, *args, **kwargs):
+        return self._inner.encode(*args, **kwargs)
+
+
+@pytest.fixture
+def counting_jwt(monkeypatch: pytest.MonkeyPatch) -> _CountingJWT:
+    jwt = _CountingJWT()
+    monkeypatch.setattr(auth, "_jwt", lambda: jwt, raising=True)
+    monkeypatch.setattr(auth, "token_cache", LRUCache(maxsize=8, ttl=60), raising=True)
+    monkeypatch.setattr(auth, "_revoked_tokens", auth.RevocationList(max_entries=8), raising=True)
+    return jwt
+
+
+def test_verify_token_decodes_repeated_token_once(counting_jwt: _CountingJWT):
+    token = auth.create_token(User(id=1, username="alice", password="x"))
+
+    first = auth.verify_token(token)
+    second = auth.verify_token(token)
+
+    assert first == second
+    assert counting_jwt.decodes == 1
+    assert auth.token_cache.info()["hits"] == 1
+
+
+def test_verify_token_cache_never_returns_payload_past_expiry(counting_jwt: _CountingJWT, monkeypatch: pytest.MonkeyPatch):
+    token = auth.create_token(User(id=1, username="alice", password="x"))
+    payload = auth.verify_token(token)
+
+    monkeypatch.setattr(auth.time, "time", lambda: payload["exp"] + 1)
+    auth.verify_token(token)
+    assert counting_jwt.decodes == 2
+
+
+def test_verify_token_does_not_cache_invalid_tokens(counting_jwt: _CountingJWT):
+    for _ in range(2):
+        with pytest.raises(erri.BusinessError):
+            auth.verify_token("not-a-jwt")
+    assert counting_jwt.decodes == 2
+    assert auth.token_cache.info()["size"] == 0
+
+
+def test_revoke_token_purges_cache_and_rejects_token(counting_jwt: _CountingJWT):
+    token = auth.create_token(User(id=1, username="alice", password="x"))
+    auth.verify_token(token)
+
+    auth.revoke_token(token)
+
+    assert auth.token_cache.info()["size"] == 0
+    with pytest.raises(erri.BusinessError) as exc:
+        auth.verify_token(token)
+    assert exc.value.status_code == 401
+
+
+def test_revocations_are_kept_until_exp_and_fail_closed_when_full(counting_jwt: _CountingJWT, monkeypatch: pytest.MonkeyPatch):
+    now = [time.time() - 120]
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    monkeypatch.setattr(auth, "_revoked_tokens", auth.RevocationList(max_entries=2), raising=True)
+    old = [auth.create_token(User(id=i, username=f"user{i}", password="x")) for i in range(2)]
+    for token in old:
+        auth.revoke_token(token)
+
+    now[0] += 60
+    newer = auth.create_token(User(id=3, username="user3", password="x"))
+    with pytest.raises(erri.BusinessError) as exc:
+        auth.revoke_token(newer)
+    assert exc.value.status_code == 503
+    for token in old:
+        with pytest.raises(erri.BusinessError):
+            auth.verify_token(token)
+
+    # Once the revoked tokens have expired, their entries make room again.
+    now[0] += auth.JWT_EXPIRE_SECONDS - 30
+    auth.revoke_token(newer)
+    assert len(auth._revoked_tokens) == 1
+    with pytest.raises(erri.BusinessError):
+        auth.verify_token(newer)
+
+
+def test_jwt_middleware_is_pure_asgi_and_sets_state_user():
+    auth.EXEMPT_PATHS.clear()
+    seen: dict[str, object] = {}
+
+    async def inner(scope, receive, send):
+        seen["user"] = scope["state"]["user"]
+        await send({"type": "http.response.start", "status": 204, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    client = TestClient(auth.JWTMiddleware(inner))
+    token = auth.create_token(User(id=1, username="alice", password="x"))
+
+    assert client.get("/anything").status_code == 401
+    resp = client.get("/anything", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 204
+    assert seen["user"] == "alice"
+
+
+def test_middleware_attaches_principal_and_verifies_token_once(counting_jwt: _CountingJWT, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "token_cache", NullCache(), raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+
+    @app.get("/principal")
+    async def principal(current_user: auth.CurrentUser, request: Request):
+        assert auth.get_username(request) == current_user.subject
+        return dataclasses.asdict(current_user)
+
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    token = auth.create_token(User(id=42, username="alice", password="x", role="admin"))
+    resp = client.get("/principal", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["subject"] == "alice"
+    assert body["user_id"] == 42
+    assert body["role"] == "admin"
+    assert body["expires_at"] > body["issued_at"]
+    assert counting_jwt.decodes == 1
+
+
+def test_current_user_dependency_without_middleware_returns_401():
+    app = FastAPI()
+
+    @app.get("/principal")
+    async def principal(current_user: auth.CurrentUser):
+        return {"sub": current_user.subject}
+
+    client = TestClient(app)
+    resp = client.get("/principal")
+    assert resp.status_code == 401
+    assert resp.json() == {"detail": "Unauthorized"}
+
+    token = auth.create_token(User(id=1, username="bob", password="x"))
+    resp = client.get("/principal", headers={"Authorization": f"Bearer {token}"})
+    assert resp.json() == {"sub": "bob"}
+
+
+def test_principal_is_immutable():
+    principal = auth.Principal.from_claims({"sub": "alice", "iat": 1, "exp": 2, "uid": 3, "role": "user"})
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        principal.subject = "mallory"  # type: ignore[misc]
+
+
+def test_principal_requires_subject():
+    with pytest.raises(erri.BusinessError) as exc:
+        auth.Principal.from_claims({"iat": 1, "exp": 2})
+    assert exc.value.status_code == 401
+
+
+def _fat_user(**overrides) -> User:
+    fields = dict(
+        id=1,
+        username="alice",
+        password="x",
+        nickname="Alice",
+        email="alice@example.com",
+        avatar_url="https://example.com/a.png",
+        role="user",
+        is_active=True,
+    )
+    fields.update(overrides)
+    return User(**fields)
+
+
+def test_user_me_answers_from_fresh_profile_claims(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "JWT_PROFILE_CLAIMS", True, raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    async def _get_user_profile_async(username: str) -> User:
+        raise AssertionError("profile must come from token claims")
+
+    monkeypatch.setattr(user_handler.service, "get_user_profile_async", _get_user_profile_async, raising=True)
+
+    token = auth.create_token(_fat_user())
+    resp = client.get("/user/me", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "username": "alice",
+        "nickname": "Alice",
+        "email": "alice@example.com",
+        "avatar_url": "https://example.com/a.png",
+        "role": "user",
+        "is_active": True,
+    }
+
+
+def test_user_me_falls_back_to_database_when_claims_are_stale(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "JWT_PROFILE_CLAIMS", True, raising=True)
+    monkeypatch.setattr(auth, "JWT_PROFILE_MAX_AGE_SECONDS", -1, raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    monkeypatch.setattr(user_handler.service, "get_user_profile", lambda username: _fat_user(nickname="FromDB"), raising=True)
+
+    token = auth.create_token(_fat_user())
+    resp = client.get("/user/me", headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200
+    assert resp.json()["nickname"] == "FromDB"
+
+
+def test_user_me_patch_issues_refreshed_token_in_fat_token_mode(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "JWT_PROFILE_CLAIMS", True, raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    monkeypatch.setattr(
+        user_handler.service,
+        "update_my_profile",
+        lambda username, *, nickname, email, avatar_url: _fat_user(nickname=nickname),
+        raising=True,
+    )
+
+    token = auth.create_token(_fat_user())
+    resp = client.patch("/user/me", headers={"Authorization": f"Bearer {token}"}, json={"nickname": "NewName"})
+    assert resp.status_code == 200
+    refreshed = auth.Principal.from_claims(auth.verify_token(resp.headers["x-jwt-token"]))
+    assert refreshed.profile is not None
+    assert refreshed.profile.nickname == "NewName"
+
+
+def test_create_token_drops_profile_claims_over_size_cap(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "JWT_PROFILE_CLAIMS", True, raising=True)
+    monkeypatch.setattr(auth, "JWT_MAX_TOKEN_BYTES", 300, raising=True)
+
+    token = auth.create_token(_fat_user(avatar_url="https://example.com/" + "a" * 500))
+    assert len(token) <= 300
+    principal = auth.Principal.from_claims(auth.verify_token(token))
+    assert principal.profile is None
+    assert principal.subject == "alice"
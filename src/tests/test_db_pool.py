@@ -0,0 +1,80 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import NullPool, QueuePool
+
+from conf import db
+from conf.pool import PoolStats, instrumented_pool_class, pool_snapshot, track_checkouts
+from internal import handler as internal_handler
+from middleware import auth
+from user.model import User
+
+
+def _engine(stats: PoolStats, pool_cls=QueuePool, **kwargs):
+    engine = create_engine("sqlite://", poolclass=instrumented_pool_class(pool_cls, stats), **kwargs)
+    track_checkouts(engine, stats)
+    return engine
+
+
+def test_instrumented_pool_tracks_checked_out_connections_and_wait_time():
+    stats = PoolStats()
+    engine = _engine(stats, pool_size=2, max_overflow=1)
+
+    conn = engine.connect()
+    snapshot = pool_snapshot(engine.pool, stats)
+    assert snapshot["checked_out"] == 1
+    assert snapshot["size"] == 2
+    assert snapshot["checkout_wait_seconds"]["count"] == 1
+
+    conn.close()
+    assert pool_snapshot(engine.pool, stats)["checked_out"] == 0
+    engine.dispose()
+
+
+def test_instrumented_pool_reports_overflow_and_checkout_timeouts():
+    stats = PoolStats()
+    engine = _engine(stats, pool_size=1, max_overflow=1, pool_timeout=0.01)
+
+    first = engine.connect()
+    second = engine.connect()
+    assert pool_snapshot(engine.pool, stats)["overflow"] == 1
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+
+    snapshot = pool_snapshot(engine.pool, stats)
+    assert snapshot["checkout_timeouts"] == 1
+    assert snapshot["checkout_wait_seconds"]["count"] == 3
+    first.close()
+    second.close()
+    engine.dispose()
+
+
+def test_instrumented_pool_survives_dispose():
+    stats = PoolStats()
+    engine = _engine(stats, pool_cls=NullPool)
+    engine.dispose()
+
+    with engine.connect():
+        assert pool_snapshot(engine.pool, stats)["checked_out"] == 1
+    assert type(engine.pool).__name__ == "InstrumentedNullPool"
+    assert pool_snapshot(engine.pool, stats)["overflow"] is None
+
+
+def test_internal_pool_endpoint_requires_admin_and_returns_stats(monkeypatch: pytest.MonkeyPatch):
+    auth.EXEMPT_PATHS.clear()
+    monkeypatch.setattr(db, "get_pool_stats", lambda: {"sync": {"checked_out": 3}}, raising=True)
+    app = FastAPI()
+    app.include_router(internal_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    member = {"Authorization": "Bearer " + auth.create_token(User(id=2, username="bob", password="x"))}
+    admin = {"Authorization": "Bearer " + auth.create_token(User(id=1, username="root", password="x", role="admin"))}
+
+    assert client.get("/internal/db/pool").status_code == 401
+    assert client.get("/internal/db/pool", headers=member).status_code == 403
+    resp = client.get("/internal/db/pool", headers=admin)
+    assert resp.status_code == 200
+    assert resp.json() == {"sync": {"checked_out": 3}}
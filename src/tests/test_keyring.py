@@ -0,0 +1,155 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+pytest.importorskip("cryptography")
+
+from common import erri  # noqa: E402
+from common.cache import LRUCache, NullCache  # noqa: E402
+from internal import handler as internal_handler  # noqa: E402
+from middleware import auth, keyring  # noqa: E402
+from user.model import User  # noqa: E402
+
+
+@pytest.fixture
+def keys(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    for kid, alg in (("ed-1", "EdDSA"), ("es-1", "ES256"), ("rs-1", "RS256")):
+        keyring.generate_key(tmp_path, kid, alg)
+    ring = keyring.Keyring(tmp_path, signing_kid="ed-1", reload_seconds=0)
+    monkeypatch.setattr(auth, "_keyring", lambda: ring, raising=True)
+    monkeypatch.setattr(auth, "token_cache", NullCache(), raising=True)
+    return ring
+
+
+def _user() -> User:
+    return User(id=1, username="alice", password="x")
+
+
+@pytest.mark.parametrize("kid, alg", [("ed-1", "EdDSA"), ("es-1", "ES256"), ("rs-1", "RS256")])
+def test_tokens_carry_kid_and_verify_with_cached_key_objects(keys, kid, alg):
+    keys.signing_kid = kid
+    token = auth.create_token(_user())
+
+    header = auth.get_unverified_header(token)
+    assert header == {"alg": alg, "kid": kid, "typ": "JWT"}
+    assert auth.verify_token(token)["sub"] == "alice"
+    assert keys.get(kid) is keys.get(kid)
+
+
+def test_rotation_keeps_old_tokens_valid_and_new_kids_are_picked_up(keys, tmp_path):
+    old = auth.create_token(_user())
+    keyring.generate_key(tmp_path, "ed-2", "EdDSA")
+    keys.signing_kid = "ed-2"
+    # Picked up by the next rescan without an explicit reload().
+    new = auth.create_token(_user())
+
+    assert auth.get_unverified_header(new)["kid"] == "ed-2"
+    assert auth.verify_token(old)["sub"] == "alice"
+    assert auth.verify_token(new)["sub"] == "alice"
+
+
+def test_verify_only_keyring_rejects_unknown_kid_and_algorithm_confusion(keys, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    token = auth.create_token(_user())
+    public_only = tmp_path / "public"
+    public_only.mkdir()
+    (public_only / "ed-1.pub.pem").write_bytes((tmp_path / "ed-1.pub.pem").read_bytes())
+    verifier = keyring.Keyring(public_only, reload_seconds=3600)
+    monkeypatch.setattr(auth, "_keyring", lambda: verifier, raising=True)
+
+    assert auth.verify_token(token)["sub"] == "alice"
+    with pytest.raises(erri.BusinessError):
+        auth.create_token(_user())
+
+    forged = auth.PyJWT().encode(
+        {"sub": "mallory", "exp": int(time.time()) + 60},
+        "s" * 32,
+        algorithm="HS256",
+        headers={"kid": "ed-1"},
+    )
+    unknown = auth.PyJWT().encode({"sub": "mallory"}, "s" * 32, algorithm="HS256", headers={"kid": "nope"})
+    for bad in (forged, unknown):
+        with pytest.raises(erri.BusinessError) as exc:
+            auth.verify_token(bad)
+        assert exc.value.status_code == 401
+
+
+def test_deleting_a_public_key_revokes_its_kid_including_cached_tokens(keys, tmp_path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(auth, "token_cache", LRUCache(maxsize=8, ttl=60), raising=True)
+    keys.signing_kid = "es-1"
+    token = auth.create_token(_user())
+    assert auth.verify_token(token)["sub"] == "alice"
+    assert auth.verify_token(token)["sub"] == "alice"
+    assert auth.token_cache.info()["hits"] == 1
+
+    # Only the public half is removed; the private key left behind must not keep the kid trusted.
+    (tmp_path / "es-1.pub.pem").unlink()
+
+    with pytest.raises(erri.BusinessError) as exc:
+        auth.verify_token(token)
+    assert exc.value.status_code == 401
+    assert auth.token_cache.info()["size"] == 0
+    assert "es-1" not in {key["kid"] for key in auth.jwks()["keys"]}
+
+
+def test_keyring_rescans_on_interval_even_when_lookups_hit(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    keyring.generate_key(tmp_path, "ed-1", "EdDSA")
+    keyring.generate_key(tmp_path, "ed-2", "EdDSA")
+    now = [1000.0]
+    monkeypatch.setattr(keyring.time, "monotonic", lambda: now[0])
+    ring = keyring.Keyring(tmp_path, reload_seconds=60)
+    (tmp_path / "ed-1.pub.pem").unlink()
+
+    assert ring.get("ed-1") is not None
+    now[0] += 60
+    assert ring.get("ed-1") is None
+
+
+def test_jwks_endpoint_publishes_public_keys_only(keys):
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(internal_handler.well_known_router)
+    auth.setup_jwt_middleware(app)
+
+    resp = TestClient(app).get("/.well-known/jwks.json")
+
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"].startswith("public")
+    published = {key["kid"]: key for key in resp.json()["keys"]}
+    assert set(published) == {"ed-1", "es-1", "rs-1"}
+    assert published["ed-1"]["alg"] == "EdDSA" and published["ed-1"]["kty"] == "OKP"
+    assert published["es-1"]["crv"] == "P-256"
+    assert all("d" not in key for key in published.values())
+
+
+def test_keyring_skips_bad_files_and_keeps_previous_keys(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    keyring.generate_key(tmp_path, "ed-1", "EdDSA")
+    keyring.generate_key(tmp_path, "ed-2", "EdDSA")
+    now = [1000.0]
+    monkeypatch.setattr(keyring.time, "monotonic", lambda: now[0])
+    ring = keyring.Keyring(tmp_path, signing_kid="ed-1", reload_seconds=60)
+    (tmp_path / "bad.pub.pem").write_text("not a key")
+    (tmp_path / "ed-2.pem").write_text("truncated")
+
+    now[0] += 60
+    assert ring.get("bad") is None
+    assert ring.get("ed-2") is not None
+    assert ring.signing_entry().kid == "ed-1"
+
+    # The signing key keeps working while its file is being replaced.
+    (tmp_path / "ed-1.pem").write_text("truncated")
+    now[0] += 60
+    assert ring.signing_entry().kid == "ed-1"
+
+    # A scan that fails or finds nothing is discarded, but still counts as a
+    # scan: the directory isn't re-read on every request until it is fixed.
+    scans = []
+    monkeypatch.setattr(ring, "_scan", lambda: scans.append(1) or ({}, {}))
+    now[0] += 60
+    assert ring.get("ed-1") is not None and ring.get("ed-2") is not None
+    assert ring.jwks()["keys"] and scans == [1]
+    monkeypatch.setattr(ring, "_scan", lambda: scans.append(1) or 1 / 0)
+    now[0] += 60
+    assert ring.get("ed-1") is not None
+    assert ring.get("missing") is None and scans == [1, 1]
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from common import metrics
+from internal import handler as internal_handler
+from middleware import auth
+from middleware import metrics as metrics_middleware
+from user.model import User
+
+
+def test_counter_and_gauge_render_prometheus_text():
+    registry = metrics.Registry()
+    requests = registry.register(metrics.Counter("requests_total", "Requests.", ("route",)))
+    in_flight = registry.register(metrics.Gauge("in_flight", "In flight."))
+    requests.inc(route="/a")
+    requests.inc(2, route="/a")
+    in_flight.inc()
+    in_flight.dec()
+
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a"} 3' in text
+    assert "in_flight 0" in text
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = metrics.Registry()
+    latency = registry.register(metrics.HistogramMetric("latency_seconds", "Latency.", ("op",), buckets=(0.1, 1.0)))
+    latency.observe(0.05, op="q")
+    latency.observe(0.5, op="q")
+    latency.observe(5, op="q")
+
+    text = registry.render()
+    assert 'latency_seconds_bucket{op="q",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{op="q",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{op="q",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{op="q"} 3' in text
+
+
+def test_metric_rejects_unknown_labels():
+    counter = metrics.Counter("c_total", "C.", ("route",))
+    with pytest.raises(ValueError):
+        counter.inc(path="/raw")
+
+
+def test_callback_gauge_reads_values_at_render_time():
+    registry = metrics.Registry()
+    value = {"n": 1}
+    registry.register(metrics.Gauge("pool", "Pool.", ("engine",), callback=lambda: {("sync",): value["n"]}))
+    value["n"] = 4
+    assert 'pool{engine="sync"} 4' in registry.render()
+
+
+def test_timed_decorator_supports_sync_and_async_functions():
+    latency = metrics.HistogramMetric("op_seconds", "Op.", ("op",))
+
+    @metrics.timed(latency, op="sync")
+    def sync_op():
+        return 1
+
+    @metrics.timed(latency, op="async")
+    async def async_op():
+        return 2
+
+    assert sync_op() == 1
+    assert asyncio.run(async_op()) == 2
+    assert latency.labels(op="sync").snapshot()["count"] == 1
+    assert latency.labels(op="async").snapshot()["count"] == 1
+
+
+def test_metrics_middleware_labels_by_route_template_and_serves_metrics():
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    router = APIRouter()
+
+    @router.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.include_router(router)
+    app.include_router(internal_handler.metrics_router)
+    auth.setup_jwt_middleware(app)
+    metrics_middleware.setup_metrics_middleware(app)
+    client = TestClient(app)
+
+    token = auth.create_token(User(id=1, username="alice", password="x"))
+    before = metrics_middleware.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200")
+    for item_id in range(3):
+        assert client.get(f"/items/{item_id}", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    unauthorized = metrics_middleware.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="401")
+    assert client.get("/items/9").status_code == 401
+
+    assert metrics_middleware.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200") == before + 3
+    assert metrics_middleware.HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="401") == unauthorized + 1
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'route="/items/{item_id}"' in resp.text
+    assert "/items/1" not in resp.text
+    assert "http_requests_in_flight" in resp.text
+    assert "db_pool_checked_out" in resp.text
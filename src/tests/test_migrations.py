@@ -0,0 +1,48 @@
+import pytest
+from sqlalchemy import create_engine
+
+from conf import alembic_runner, config, db
+
+
+@pytest.fixture
+def migration_db(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    url = f"sqlite:///{tmp_path / 'migrations.db'}"
+    monkeypatch.setattr(config, "DATABASE_URL", url, raising=True)
+    monkeypatch.setattr(alembic_runner, "DATABASE_URL", url, raising=True)
+    engine = create_engine(url)
+    monkeypatch.setattr(db, "engine", engine, raising=True)
+    yield engine
+    engine.dispose()
+
+
+def test_check_head_fails_until_upgraded(migration_db):
+    with pytest.raises(RuntimeError, match="conf.migrate upgrade"):
+        alembic_runner.check_head(migration_db)
+
+    alembic_runner.upgrade_head(migration_db)
+
+    assert alembic_runner.current_revision(migration_db) == alembic_runner.head_revision()
+    alembic_runner.check_head(migration_db)
+
+
+def test_init_db_honours_migrate_mode(migration_db, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(db, "DB_MIGRATE_MODE", "skip", raising=True)
+    db.init_db()
+    assert alembic_runner.current_revision(migration_db) is None
+
+    monkeypatch.setattr(db, "DB_MIGRATE_MODE", "check", raising=True)
+    with pytest.raises(RuntimeError):
+        db.init_db()
+
+    monkeypatch.setattr(db, "DB_MIGRATE_MODE", "upgrade", raising=True)
+    db.init_db()
+    monkeypatch.setattr(db, "DB_MIGRATE_MODE", "check", raising=True)
+    db.init_db()
+
+    monkeypatch.setattr(db, "DB_MIGRATE_MODE", "sometimes", raising=True)
+    with pytest.raises(ValueError):
+        db.init_db()
+
+
+def test_script_head_matches_alembic_without_importing_it():
+    assert alembic_runner.script_head() == alembic_runner.head_revision()
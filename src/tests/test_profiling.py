@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+
+from conf import db
+from middleware import auth
+from middleware import profiling
+from user.model import User
+
+
+def _spin(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _unrelated_work(stop: threading.Event) -> None:
+    while not stop.is_set():
+        _spin(0.001)
+
+
+def _app(ring: profiling.ProfileRing, *, sample_rate: float, allowed: frozenset[str] = frozenset()) -> FastAPI:
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        with db.engine.connect() as conn:
+            conn.execute(text("SELECT 1")).scalar_one()
+        return {"ok": True}
+
+    @app.get("/offload")
+    async def offload():
+        await profiling.run_in_threadpool(_spin, 0.1)
+        return {"ok": True}
+
+    app.add_middleware(profiling.ProfilingMiddleware, sample_rate=sample_rate, allowed_subjects=allowed, ring=ring)
+    auth.setup_jwt_middleware(app)
+    return app
+
+
+def _token(username: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {auth.create_token(User(id=1, username=username, password='x'))}"}
+
+
+def test_sampled_request_writes_profile_and_sql(tmp_path, sqlite_engine):
+    profiling.instrument_engine(sqlite_engine)
+    ring = profiling.ProfileRing(str(tmp_path), max_files=5, fmt="collapsed")
+    client = TestClient(_app(ring, sample_rate=1.0))
+
+    assert client.get("/work", headers=_token("alice")).status_code == 200
+
+    collapsed = list(tmp_path.glob("*.collapsed"))
+    assert len(collapsed) == 1
+    meta = json.loads(next(tmp_path.glob("*.meta.json")).read_text())
+    assert meta["path"] == "/work"
+    assert meta["status"] == 200
+    assert meta["reason"] == "sampled"
+    assert any(q["statement"] == "SELECT 1" for q in meta["sql"])
+
+
+def test_header_flag_only_profiles_allow_listed_principals(tmp_path, sqlite_engine):
+    ring = profiling.ProfileRing(str(tmp_path), max_files=5, fmt="speedscope")
+    client = TestClient(_app(ring, sample_rate=0.0, allowed=frozenset({"alice"})))
+
+    client.get("/work", headers={**_token("mallory"), "x-profile": "1"})
+    assert list(tmp_path.iterdir()) == []
+
+    client.get("/work", headers={**_token("alice"), "x-profile": "1"})
+    profiles = list(tmp_path.glob("*.speedscope.json"))
+    assert len(profiles) == 1
+    assert json.loads(profiles[0].read_text())["profiles"][0]["type"] == "sampled"
+
+
+def test_profile_ring_keeps_at_most_max_files(tmp_path, sqlite_engine):
+    ring = profiling.ProfileRing(str(tmp_path), max_files=2, fmt="collapsed")
+    client = TestClient(_app(ring, sample_rate=1.0))
+
+    for _ in range(4):
+        client.get("/work", headers=_token("alice"))
+
+    assert len(list(tmp_path.glob("*.collapsed"))) == 2
+    assert len(list(tmp_path.glob("*.meta.json"))) == 2
+
+
+def test_profile_samples_only_the_request_threads(tmp_path, sqlite_engine, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(profiling, "PROFILING_INTERVAL_MS", 1, raising=True)
+    ring = profiling.ProfileRing(str(tmp_path), max_files=5, fmt="collapsed")
+    app = _app(ring, sample_rate=1.0)
+    stop = threading.Event()
+    noise = threading.Thread(target=_unrelated_work, args=(stop,), name="noise")
+    noise.start()
+    try:
+        assert TestClient(app).get("/offload", headers=_token("alice")).status_code == 200
+    finally:
+        stop.set()
+        noise.join()
+
+    stacks = next(tmp_path.glob("*.collapsed")).read_text().splitlines()
+    assert any("_spin" in stack for stack in stacks)
+    assert not any(stack.startswith("noise;") or "_unrelated_work" in stack for stack in stacks)
+
+
+def test_setup_profiling_middleware_is_a_no_op_when_disabled(monkeypatch: pytest.MonkeyPatch, sqlite_engine):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False, raising=True)
+    app = FastAPI()
+    profiling.setup_profiling_middleware(app)
+
+    assert app.user_middleware == []
+    assert not event.contains(sqlite_engine, "before_cursor_execute", profiling._on_before_execute)
@@ -0,0 +1,42 @@
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common import response
+from user import dto
+from user.model import User
+
+
+def test_dumps_serializes_models_without_revalidation_and_dicts_compactly():
+    user = User(id=1, username="alice", password="secret", nickname="Al", role="admin")
+    profile = dto.UserProfileResponse.model_validate(user)
+
+    assert json.loads(response.dumps(profile)) == {
+        "username": "alice",
+        "nickname": "Al",
+        "email": None,
+        "avatar_url": None,
+        "role": "admin",
+        "is_active": True,
+    }
+    assert response.dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'.encode()
+
+
+def test_fast_json_response_is_used_as_default_response_class():
+    app = FastAPI(default_response_class=response.FastJSONResponse)
+
+    @app.get("/profile", response_model=dto.UserProfileResponse)
+    async def profile():
+        return response.FastJSONResponse(dto.UserProfileResponse.model_validate(User(id=1, username="bob", password="x")))
+
+    @app.get("/plain")
+    async def plain():
+        return {"ok": True}
+
+    client = TestClient(app)
+    assert client.get("/profile").json()["username"] == "bob"
+    assert "password" not in client.get("/profile").json()
+    resp = client.get("/plain")
+    assert resp.content == b'{"ok":true}'
+    assert resp.headers["content-type"] == "application/json"
@@ -0,0 +1,96 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+import serve
+from conf import db
+
+SRC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_engine_pool_is_reset_in_forked_children(monkeypatch: pytest.MonkeyPatch):
+    engine = create_engine("sqlite://", poolclass=QueuePool)
+    monkeypatch.setattr(db, "engine", engine, raising=True)
+    engine.connect().close()
+    inherited = engine.pool
+    assert inherited.checkedin() == 1
+
+    db._reset_after_fork()
+
+    assert engine.pool is not inherited
+    assert engine.pool.checkedin() == 0
+
+
+def test_build_config_preloads_app_and_prefers_fast_event_loop():
+    config = serve.build_config("127.0.0.1", 0, 64, 7, 3, preload=True)
+
+    import main
+
+    assert config.app is main.app
+    assert config.loop == serve.event_loop()
+    assert config.http == serve.http_protocol()
+    assert (config.backlog, config.timeout_keep_alive, config.timeout_graceful_shutdown) == (64, 7, 3)
+    assert serve.build_config("127.0.0.1", 0, 64, 7, 3, preload=False).app == serve.APP
+
+
+def _status(url: str) -> int:
+    try:
+        return urllib.request.urlopen(url, timeout=5).status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_supervisor_serves_from_workers_and_drains_on_sigterm():
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "serve", "--host", "127.0.0.1", "--port", "0", "--workers", "2", "--graceful-timeout", "5"],
+        cwd=SRC,
+        env={**os.environ, "PYTHONPATH": SRC, "DB_MIGRATE_MODE": "skip"},
+        stderr=subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        port = None
+        deadline = time.monotonic() + 30
+        while port is None and time.monotonic() < deadline:
+            match = re.search(r"listening on http://127\.0\.0\.1:(\d+)", proc.stderr.readline())
+            port = int(match.group(1)) if match else None
+        assert port is not None
+
+        status = None
+        while time.monotonic() < deadline:
+            try:
+                status = _status(f"http://127.0.0.1:{port}/")
+                break
+            except OSError:
+                time.sleep(0.1)
+        assert status == 401
+
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=30) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stderr.close()
+
+
+def test_user_cache_defaults_to_none_with_several_workers(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.delenv("USER_CACHE_BACKEND", raising=False)
+    monkeypatch.setattr(serve, "USER_CACHE_BACKEND", "memory", raising=True)
+    assert serve.user_cache_backend(1) == "memory"
+    assert serve.user_cache_backend(4) == "none"
+
+    # An explicit choice is kept (serve only warns about it).
+    monkeypatch.setenv("USER_CACHE_BACKEND", "memory")
+    assert serve.user_cache_backend(4) == "memory"
+    monkeypatch.setattr(serve, "USER_CACHE_BACKEND", "shared", raising=True)
+    assert serve.user_cache_backend(4) == "shared"
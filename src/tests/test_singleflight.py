@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+from common.singleflight import AsyncSingleFlight, SingleFlight
+from user import model, service
+
+
+@pytest.fixture
+def flights(monkeypatch: pytest.MonkeyPatch) -> SingleFlight:
+    lookups = SingleFlight()
+    monkeypatch.setattr(model, "_lookups", lookups, raising=True)
+    monkeypatch.setattr(model, "_async_lookups", AsyncSingleFlight(), raising=True)
+    return lookups
+
+
+def test_singleflight_shares_result_and_errors():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        if len(calls) > 1:
+            raise RuntimeError("boom")
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while flight.shared < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert len(results) == 5 and all(r is results[0] for r in results)
+
+    # Completed calls are not remembered, and errors reach every caller.
+    errors = []
+
+    def failing():
+        try:
+            flight.do("k", slow)
+        except RuntimeError as e:
+            errors.append(e)
+
+    release.clear()
+    threads = [threading.Thread(target=failing) for _ in range(3)]
+    for t in threads:
+        t.start()
+    while flight.shared < 6:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 2 and len(errors) == 3
+
+
+def test_async_singleflight_shares_result_and_errors():
+    async def main():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def lookup():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        assert await asyncio.gather(*(flight.do("k", lookup) for _ in range(10))) == [1] * 10
+        assert len(calls) == 1 and flight.shared == 9
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise LookupError("boom")
+
+        results = await asyncio.gather(*(flight.do("k", failing) for _ in range(3)), return_exceptions=True)
+        assert [type(r) for r in results] == [LookupError] * 3
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_async_singleflight_survives_cancelled_leader():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def lookup():
+            await asyncio.sleep(0.01)
+            return "alice"
+
+        leader = asyncio.create_task(flight.do("k", lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", lookup))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "alice"
+
+    asyncio.run(main())
+
+
+def test_concurrent_profile_lookups_issue_one_query(sqlite_engine, user_cache, flights):
+    model.create_user("svc", "hashed")
+    user_cache.clear()
+    selects = []
+
+    @event.listens_for(sqlite_engine, "before_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+            # Hold the query open until every other request has joined it.
+            deadline = time.monotonic() + 5
+            while flights.shared < 7 and time.monotonic() < deadline:
+                time.sleep(0.001)
+
+    async def main():
+        return await asyncio.gather(*(service.get_user_profile_async("svc") for _ in range(8)))
+
+    users = asyncio.run(main())
+    assert [u.username for u in users] == ["svc"] * 8
+    assert len(selects) == 1
+    assert flights.shared == 7
+
+
+def test_writes_do_not_join_inflight_lookups(flights):
+    started, release = threading.Event(), threading.Event()
+
+    def stale():
+        started.set()
+        release.wait(5)
+        return "stale"
+
+    thread = threading.Thread(target=lambda: flights.do("alice", stale))
+    thread.start()
+    started.wait(5)
+    model._invalidate("alice")
+    assert flights.do("alice", lambda: "fresh") == "fresh"
+    release.set()
+    thread.join()
@@ -0,0 +1,12 @@
+from conf import startup
+from conf.config import STARTUP_BUDGET_MS
+
+
+def test_app_import_stays_lazy_and_within_startup_budget():
+    profile = startup.profile_startup()
+
+    assert [name for name in startup.LAZY_MODULES if profile.loaded(name)] == []
+    assert profile.engine_created is False
+    assert profile.first_request_status == 401
+    assert profile.time_to_first_request_ms <= STARTUP_BUDGET_MS
+    assert any(name == "main" for name, _ in profile.imports)
@@ -0,0 +1,192 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common import erri, ratelimit
+from common.kvstore import MemoryStore
+from common.ratelimit import Rate, SlidingWindowLimiter, TokenBucketLimiter
+from middleware import auth
+from user import handler as user_handler
+from user import throttle
+
+
+class _Clock:
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock, raising=True)
+    monkeypatch.setattr(ratelimit.time, "time", clock, raising=True)
+    return clock
+
+
+def test_rate_parse():
+    assert Rate.parse("10/60") == Rate(limit=10, period=60.0)
+    assert Rate.parse("5") == Rate(limit=5, period=1.0)
+    assert Rate.parse("") is None
+    assert Rate.parse("off") is None
+    with pytest.raises(ValueError):
+        Rate.parse("0/60")
+    with pytest.raises(ValueError):
+        Rate.parse("10/0")
+
+
+def test_token_bucket_allows_burst_then_refills(clock):
+    limiter = TokenBucketLimiter(max_keys=10)
+    rate = Rate(limit=3, period=3)
+
+    assert [limiter.hit("ip:1", rate) for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit("ip:1", rate) == pytest.approx(1.0)
+    assert limiter.hit("ip:2", rate) == 0
+
+    clock.now += 1
+    assert limiter.hit("ip:1", rate) == 0
+    assert limiter.hit("ip:1", rate) > 0
+
+
+def test_token_bucket_evicts_only_full_buckets(clock):
+    limiter = TokenBucketLimiter(max_keys=2)
+    rate = Rate(limit=2, period=2)
+
+    limiter.hit("a", rate)
+    limiter.hit("a", rate)
+    limiter.hit("b", rate)
+    # Neither a nor b has refilled, so a new key is refused rather than reset one of them.
+    assert limiter.hit("c", rate) == pytest.approx(2.0)
+    assert limiter.info()["keys"] == 2
+    assert limiter.evictions == 0 and limiter.overflows == 1
+
+    # b has refilled but a hasn't: b goes even though a was used less recently.
+    clock.now += 1.5
+    assert limiter.hit("c", rate) == 0
+    assert limiter.evictions == 1
+    assert limiter.hit("a", rate) == 0
+    assert limiter.hit("a", rate) > 0
+
+    clock.now += 5
+    limiter.hit("d", rate)
+    assert limiter.info()["keys"] == 1
+
+
+def test_memory_store_incr_and_expire(clock, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("common.kvstore.time.monotonic", clock, raising=True)
+    store = MemoryStore()
+
+    assert store.incr("k") == 1
+    assert store.incr("k", 2) == 3
+    assert store.expire("k", 5) is True
+    assert store.expire("missing", 5) is False
+    clock.now += 6
+    assert store.get("k") is None
+    assert store.incr("k") == 1
+
+
+def test_sliding_window_weights_previous_window(clock):
+    limiter = SlidingWindowLimiter(MemoryStore())
+    rate = Rate(limit=4, period=10)
+    clock.now = 1000.0
+
+    assert [limiter.hit("u", rate) for _ in range(4)] == [0, 0, 0, 0]
+    assert limiter.hit("u", rate) == pytest.approx(10.0)
+    assert limiter.hit("u", rate) == pytest.approx(10.0)
+
+    # Half-way through the next window, half of the previous 4 admitted hits still count.
+    clock.now = 1015.0
+    assert [limiter.hit("u", rate) for _ in range(2)] == [0, 0]
+    assert limiter.hit("u", rate) > 0
+
+
+@pytest.mark.parametrize("backend", ["memory", "shared"])
+def test_rejected_logins_do_not_drain_shared_buckets(clock, monkeypatch: pytest.MonkeyPatch, backend):
+    limiter = TokenBucketLimiter(max_keys=100) if backend == "memory" else SlidingWindowLimiter(MemoryStore())
+    monkeypatch.setattr(throttle, "limiter", limiter, raising=True)
+    monkeypatch.setitem(throttle.LOGIN_LIMITS, "login_ip", Rate(limit=3, period=60))
+    monkeypatch.setitem(throttle.LOGIN_LIMITS, "login_username", Rate(limit=5, period=60))
+    monkeypatch.setitem(throttle.LOGIN_LIMITS, "login_global", Rate(limit=5, period=60))
+
+    rejected = 0
+    for _ in range(50):
+        try:
+            throttle.check_login("10.0.0.1", "alice")
+        except erri.BusinessError:
+            rejected += 1
+    assert rejected == 47
+
+    throttle.check_login("10.0.0.2", "alice")
+    throttle.check_login("10.0.0.3", "bob")
+
+
+def test_login_is_rejected_with_retry_after_before_any_service_work(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(throttle, "limiter", TokenBucketLimiter(max_keys=100), raising=True)
+    monkeypatch.setitem(throttle.LOGIN_LIMITS, "login_username", Rate(limit=2, period=60))
+    calls: list[str] = []
+
+    def _login(username: str, password: str) -> str:
+        calls.append(username)
+        return "token"
+
+    monkeypatch.setattr(user_handler.service, "login_user", _login, raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    statuses = [client.post("/user/login", json={"username": "Alice", "password": "pw"}).status_code for _ in range(2)]
+    resp = client.post("/user/login", json={"username": "alice", "password": "pw"})
+
+    assert statuses == [200, 200]
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "30"
+    assert calls == ["Alice", "Alice"]
+    assert client.post("/user/login", json={"username": "bob", "password": "pw"}).status_code == 200
+
+
+def test_register_is_throttled_per_ip(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(throttle, "limiter", TokenBucketLimiter(max_keys=100), raising=True)
+    monkeypatch.setitem(throttle.REGISTER_LIMITS, "register_ip", Rate(limit=1, period=60))
+    monkeypatch.setattr(user_handler.service, "register_user", lambda username, password: pytest.fail("not throttled"), raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+    throttle.limiter.hit("register_ip:testclient", Rate(limit=1, period=60))
+
+    resp = client.post("/user/register", json={"username": "alice", "password": "pw"})
+
+    assert resp.status_code == 429
+    assert int(resp.headers["retry-after"]) > 0
+
+
+@pytest.mark.parametrize(
+    "hops, forwarded, key",
+    [
+        (0, "203.0.113.7", "testclient"),
+        (1, "6.6.6.6, 203.0.113.7", "203.0.113.7"),
+        (2, "6.6.6.6, 203.0.113.7, 10.0.0.2", "203.0.113.7"),
+        (2, "203.0.113.7", "testclient"),
+    ],
+)
+def test_register_throttle_keys_on_client_behind_trusted_proxies(monkeypatch: pytest.MonkeyPatch, hops, forwarded, key):
+    monkeypatch.setattr(user_handler, "THROTTLE_TRUSTED_PROXY_HOPS", hops, raising=True)
+    monkeypatch.setattr(throttle, "limiter", TokenBucketLimiter(max_keys=100), raising=True)
+    monkeypatch.setitem(throttle.REGISTER_LIMITS, "register_ip", Rate(limit=1, period=60))
+    monkeypatch.setattr(user_handler.service, "register_user", lambda username, password: pytest.fail("not throttled"), raising=True)
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    throttle.limiter.hit(f"register_ip:{key}", Rate(limit=1, period=60))
+
+    resp = TestClient(app).post(
+        "/user/register", json={"username": "alice", "password": "pw"}, headers={"X-Forwarded-For": forwarded}
+    )
+
+    assert resp.status_code == 429
@@ -0,0 +1,85 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlmodel import Session
+
+from common import erri
+from middleware import auth
+from user import handler as user_handler
+from user import model, service
+from user.model import User
+
+
+@pytest.fixture
+def users(sqlite_engine, user_cache):
+    rows = [
+        User(username="alice", password="x", nickname="Ally", email="alice@example.com", avatar_url="a.png"),
+        User(username="bob", password="x", nickname="Bobby"),
+        User(username="carol", password="x", nickname="Caz"),
+    ]
+    with Session(sqlite_engine) as session:
+        session.add_all(rows)
+        session.commit()
+        return {row.username: row.id for row in rows}
+
+
+def test_batch_resolves_ids_and_usernames_in_one_query(users, sqlite_engine, sql_statements):
+    sql_statements.clear()
+
+    batch = service.lookup_users(ids=[users["alice"], 999, users["alice"]], usernames=["bob", "nobody"])
+
+    assert len(sql_statements.selects()) == 1
+    assert list(batch.by_id) == [users["alice"]]
+    assert list(batch.by_username) == ["bob"]
+    assert batch.missing_ids == [999]
+    assert batch.missing_usernames == ["nobody"]
+
+
+def test_batch_reads_usernames_through_cache(users, sqlite_engine, user_cache, sql_statements):
+    service.lookup_users(usernames=["alice", "bob"])
+    sql_statements.clear()
+
+    batch = service.lookup_users(usernames=["alice", "bob", "carol"])
+    assert list(batch.by_username) == ["alice", "bob", "carol"]
+    assert len(sql_statements.selects()) == 1 and user_cache.stats.hits == 2
+
+    service.lookup_users(usernames=["alice", "carol"])
+    assert len(sql_statements.selects()) == 1
+
+
+def test_batch_rejects_too_many_keys(users, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "USER_BATCH_MAX_KEYS", 2, raising=True)
+    # Duplicates are counted once.
+    assert service.lookup_users(ids=[404, 404], usernames=["a"]).missing_ids == [404]
+    with pytest.raises(erri.BusinessError) as exc:
+        service.lookup_users(ids=[1, 2], usernames=["a"])
+    assert exc.value.status_code == 400
+
+
+def test_batch_query_binds_arrays_on_postgres():
+    engine = create_engine("postgresql+psycopg://")
+    statement = model._get_users(engine, [1, 2], ["alice"])
+    sql = str(statement.compile(dialect=engine.dialect))
+    assert '"user".id = ANY (%(ids)s::INTEGER[]) OR "user".username = ANY (%(usernames)s::VARCHAR[])' in sql
+
+
+def test_batch_endpoint_returns_public_profiles(users):
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+    headers = {"Authorization": "Bearer " + auth.create_token(User(id=2, username="bob", password="x"))}
+
+    resp = client.post("/user/batch", json={"ids": [users["alice"], 404], "usernames": ["carol", "zed"]}, headers=headers)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["by_id"] == {
+        str(users["alice"]): {"id": users["alice"], "username": "alice", "nickname": "Ally", "avatar_url": "a.png"}
+    }
+    assert body["by_username"]["carol"]["nickname"] == "Caz"
+    assert body["missing_ids"] == [404]
+    assert body["missing_usernames"] == ["zed"]
+
+    assert client.post("/user/batch", json={"ids": []}).status_code == 401
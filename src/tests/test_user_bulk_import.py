@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware import auth
+from user import bulk_import
+from user import handler as user_handler
+from user import model
+from user import password as passwords
+
+
+@pytest.fixture(autouse=True)
+def _cheap_kdf(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "PASSWORD_SCRYPT_LN", 4, raising=True)
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def _run(data: bytes, fmt: str, batch_size: int = 2, chunk_size: int = 7) -> list[dict]:
+    async def _collect():
+        return [entry async for entry in bulk_import.import_users(_chunks(data, chunk_size), fmt, batch_size)]
+
+    return asyncio.run(_collect())
+
+
+def test_import_ndjson_reports_created_duplicate_and_invalid(sqlite_engine, user_cache):
+    model.create_user("taken", "hashed")
+    data = b"\n".join(
+        [
+            b'{"username": "alice", "password": "pw", "email": "a@example.com"}',
+            b'{"username": "bob", "password": "pw"}',
+            b'{"username": "alice", "password": "pw2"}',
+            b'{"username": "taken", "password": "pw"}',
+            b"not json",
+            b'{"username": "carol"}',
+        ]
+    )
+
+    entries = _run(data, "ndjson")
+
+    assert [(e["line"], e["username"], e["status"]) for e in entries[:-1]] == [
+        (1, "alice", "created"),
+        (2, "bob", "created"),
+        (3, "alice", "duplicate"),
+        (4, "taken", "duplicate"),
+        (5, None, "invalid"),
+        (6, "carol", "invalid"),
+    ]
+    assert entries[-1] == {"summary": {"created": 2, "duplicate": 2, "invalid": 2}}
+
+    alice = model.get_user("alice")
+    assert alice.nickname == "alice"
+    assert alice.email == "a@example.com"
+    assert passwords.verify_password("pw", alice.password)
+    assert model.get_user_credentials("taken").password == "hashed"
+
+
+def test_import_csv_uses_header_and_skips_blank_lines(sqlite_engine, user_cache):
+    data = b"username,password,nickname\r\nalice,pw,Alice\r\n\r\nbob,pw,\r\n"
+
+    entries = _run(data, "csv")
+
+    assert [e["status"] for e in entries[:-1]] == ["created", "created"]
+    assert model.get_user("alice").nickname == "Alice"
+    assert model.get_user("bob").nickname == "bob"
+
+
+def test_import_rejects_oversized_lines(sqlite_engine, user_cache, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(bulk_import, "BULK_IMPORT_MAX_LINE_BYTES", 64, raising=True)
+    data = b'{"username": "alice", "password": "' + b"x" * 200 + b'"}\n{"username": "bob", "password": "pw"}'
+
+    entries = _run(data, "ndjson", chunk_size=16)
+
+    assert [(e["line"], e["status"]) for e in entries[:-1]] == [(1, "invalid"), (2, "created")]
+    assert model.get_user("alice") is None
+
+
+@pytest.mark.parametrize("chunk_size", [60, 4096])
+def test_import_rejects_oversized_line_ending_in_later_or_same_chunk(
+    sqlite_engine, user_cache, monkeypatch: pytest.MonkeyPatch, chunk_size
+):
+    monkeypatch.setattr(bulk_import, "BULK_IMPORT_MAX_LINE_BYTES", 64, raising=True)
+    # 90 bytes: with 60-byte chunks the buffer never exceeds the limit before the newline arrives.
+    line = b'{"username": "alice", "password": "' + b"x" * 53 + b'"}'
+    assert len(line) == 90
+    data = line + b'\n{"username": "bob", "password": "pw"}\n' + line
+
+    entries = _run(data, "ndjson", chunk_size=chunk_size)
+
+    assert [(e["line"], e["status"]) for e in entries[:-1]] == [(1, "invalid"), (2, "created"), (3, "invalid")]
+    assert model.get_user("alice") is None
+
+
+def test_detect_format():
+    assert bulk_import.detect_format("text/csv") == "csv"
+    assert bulk_import.detect_format("application/x-ndjson") == "ndjson"
+    assert bulk_import.detect_format(None, "csv") == "csv"
+    with pytest.raises(ValueError):
+        bulk_import.detect_format(None, "xml")
+
+
+def test_import_endpoint_streams_report_for_admins_only(sqlite_engine, user_cache):
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+    admin = auth.create_token(model.User(id=1, username="root", password="x", role="admin"))
+    member = auth.create_token(model.User(id=2, username="bob", password="x"))
+    body = b"username,password\nalice,pw\n"
+
+    resp = client.post("/user/admin/import", content=body, headers={"Authorization": f"Bearer {member}", "Content-Type": "text/csv"})
+    assert resp.status_code == 403
+
+    resp = client.post("/user/admin/import", content=body, headers={"Authorization": f"Bearer {admin}", "Content-Type": "text/csv"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert resp.text.splitlines() == [
+        '{"line":2,"username":"alice","status":"created"}',
+        '{"summary":{"created":1,"duplicate":0,"invalid":0}}',
+    ]
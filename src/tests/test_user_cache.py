@@ -0,0 +1,128 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from common.cache import LRUCache, NullCache, SharedCache, build_cache
+from common.kvstore import MemoryStore
+from internal import handler as internal_handler
+from middleware import auth
+from user import model, service
+
+
+def test_lru_cache_evicts_least_recently_used_entry():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats.as_dict() == {"hits": 3, "misses": 1, "evictions": 1, "expirations": 0}
+
+
+def test_lru_cache_expires_entries_after_ttl(monkeypatch: pytest.MonkeyPatch):
+    now = [100.0]
+    monkeypatch.setattr("common.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    now[0] = 109.0
+    assert cache.get("a") == 1
+    now[0] = 110.0
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+    assert cache.info()["size"] == 0
+
+
+def test_shared_cache_round_trips_through_store():
+    store = MemoryStore()
+    cache = SharedCache(store, prefix="user:", ttl=30)
+    cache.set("alice", {"username": "alice"})
+
+    assert store.get("user:alice") is not None
+    assert cache.get("alice") == {"username": "alice"}
+    cache.delete("alice")
+    assert cache.get("alice") is None
+    assert cache.stats.as_dict()["hits"] == 1
+    assert cache.stats.as_dict()["misses"] == 1
+
+
+def test_build_cache_selects_backend():
+    assert isinstance(build_cache("memory", maxsize=1, ttl=1, url="", prefix="u:"), LRUCache)
+    assert isinstance(build_cache("shared", maxsize=1, ttl=1, url="memory://", prefix="u:"), SharedCache)
+    assert isinstance(build_cache("none", maxsize=1, ttl=1, url="", prefix="u:"), NullCache)
+    with pytest.raises(ValueError):
+        build_cache("bogus", maxsize=1, ttl=1, url="", prefix="u:")
+
+
+def test_get_user_reads_through_cache(sqlite_engine, user_cache, sql_statements):
+    model.create_user("alice", "hashed")
+    user_cache.clear()
+    sql_statements.clear()
+
+    first = model.get_user("alice")
+    second = model.get_user("alice")
+
+    assert first is not None and second is not None
+    assert second.username == "alice"
+    assert second is not first
+    assert len(sql_statements.selects()) == 1
+    assert user_cache.stats.hits == 1
+
+
+def test_create_user_populates_cache(sqlite_engine, user_cache, sql_statements):
+    model.create_user("alice", "hashed")
+    sql_statements.clear()
+
+    user = model.get_user("alice")
+    assert user is not None and user.id is not None
+    assert sql_statements.selects() == []
+
+
+def test_update_user_profile_refreshes_cache(sqlite_engine, user_cache):
+    model.create_user("alice", "hashed")
+    model.update_user_profile("alice", nickname="Alice")
+
+    cached = user_cache.get("alice")
+    assert cached is not None
+    assert cached["nickname"] == "Alice"
+    assert model.get_user("alice").nickname == "Alice"
+
+
+def test_shared_backend_serves_user_model(sqlite_engine, monkeypatch: pytest.MonkeyPatch):
+    cache = SharedCache(MemoryStore(), prefix="user:", ttl=30)
+    monkeypatch.setattr(model, "user_cache", cache, raising=True)
+    model.create_user("alice", "hashed")
+
+    user = model.get_user("alice")
+    assert user is not None
+    assert cache.stats.hits == 1
+
+
+def test_cached_users_never_carry_the_password_hash(sqlite_engine, monkeypatch: pytest.MonkeyPatch):
+    store = MemoryStore()
+    monkeypatch.setattr(model, "user_cache", SharedCache(store, prefix="user:", ttl=30), raising=True)
+    model.create_user("alice", service.get_password_hash("pw"))
+
+    assert b"password" not in store.get("user:alice")
+    assert model.get_user("alice").password == ""
+    # Login reads the hash from the database, so a warm cache doesn't break it.
+    assert service.login_user("alice", "pw")
+
+
+def test_internal_user_cache_endpoint_reports_counters(user_cache):
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(internal_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+
+    admin = {"Authorization": "Bearer " + auth.create_token(model.User(id=1, username="root", password="x", role="admin"))}
+
+    user_cache.get("missing")
+    assert client.get("/internal/cache/user").status_code == 401
+    resp = client.get("/internal/cache/user", headers=admin)
+    assert resp.status_code == 200
+    assert resp.json()["misses"] == 1
+    assert resp.json()["backend"] == "memory"
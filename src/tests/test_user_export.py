@@ -0,0 +1,65 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from middleware import auth
+from user import export
+from user import handler as user_handler
+from user import model
+
+
+@pytest.fixture
+def users(sqlite_engine, user_cache):
+    for name in ("alice", "bob", "carol"):
+        model.create_user(name, "secret-hash")
+
+
+def test_export_ndjson_streams_one_chunk_per_batch_without_passwords(users):
+    chunks = list(export.export_users("ndjson", batch_size=2))
+
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+    assert [row["username"] for row in rows] == ["alice", "bob", "carol"]
+    assert set(rows[0]) == set(export.COLUMNS)
+    assert b"secret-hash" not in b"".join(chunks)
+
+
+def test_export_csv_writes_header_once(users):
+    data = b"".join(export.export_users("csv", batch_size=2)).decode()
+
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0] == list(export.COLUMNS)
+    assert [row[1] for row in rows[1:]] == ["alice", "bob", "carol"]
+
+
+def test_export_csv_of_empty_table_is_just_the_header(sqlite_engine):
+    assert b"".join(export.export_users("csv")).decode().splitlines() == [",".join(export.COLUMNS)]
+
+
+def test_export_gzip_round_trips(users):
+    data = gzip.decompress(b"".join(export.export_users("ndjson", compress=True, batch_size=1)))
+
+    assert data == b"".join(export.export_users("ndjson"))
+
+
+def test_export_endpoint_requires_admin_and_sets_download_headers(users):
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    client = TestClient(app)
+    admin = {"Authorization": "Bearer " + auth.create_token(model.User(id=1, username="root", password="x", role="admin"))}
+    member = {"Authorization": "Bearer " + auth.create_token(model.User(id=2, username="bob", password="x"))}
+
+    assert client.get("/user/admin/export", headers=member).status_code == 403
+
+    resp = client.get("/user/admin/export", params={"format": "csv", "gzip": "true"}, headers=admin)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/gzip"
+    assert 'filename="users.csv.gz"' in resp.headers["content-disposition"]
+    assert gzip.decompress(resp.content).decode().splitlines()[1].split(",")[1] == "alice"
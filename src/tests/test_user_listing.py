@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from common import erri
+from middleware import auth
+from user import handler as user_handler
+from user import service
+from user.model import User
+
+
+@pytest.fixture
+def users(sqlite_engine):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        User(username="alice", password="x", nickname="Ally", email="alice@example.com", created_at=start),
+        User(username="bob", password="x", nickname="Bobby", role="admin", created_at=start + timedelta(seconds=1)),
+        User(username="carol", password="x", nickname="Caz", is_active=False, created_at=start + timedelta(seconds=1)),
+        User(username="dave_ops", password="x", nickname="Dave", email="dave@ops.example.com", created_at=start + timedelta(seconds=2)),
+        User(username="daveXops", password="x", nickname="Davey", created_at=start + timedelta(seconds=3)),
+    ]
+    usernames = [row.username for row in rows]
+    with Session(sqlite_engine) as session:
+        session.add_all(rows)
+        session.commit()
+    return usernames
+
+
+def _walk(limit: int, filters: service.UserFilter = service.UserFilter()) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        page = service.list_user_page(cursor, limit, filters)
+        pages.append([user.username for user in page.items])
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_user_once_in_order(users):
+    assert _walk(2) == [["alice", "bob"], ["carol", "dave_ops"], ["daveXops"]]
+    assert _walk(5) == [users]
+
+
+def test_list_filters_by_role_and_active_flag(users):
+    assert _walk(10, service.UserFilter(role="admin")) == [["bob"]]
+    assert _walk(10, service.UserFilter(is_active=False)) == [["carol"]]
+
+
+def test_list_search_prefix_and_substring_escape_wildcards(users):
+    assert _walk(10, service.UserFilter(query="dav")) == [["dave_ops", "daveXops"]]
+    assert _walk(10, service.UserFilter(query="dave_")) == [["dave_ops"]]
+    assert _walk(10, service.UserFilter(query="ops", match="substring")) == [["dave_ops", "daveXops"]]
+    assert _walk(10, service.UserFilter(query="EXAMPLE", match="substring")) == [["alice", "dave_ops"]]
+
+
+def test_list_rejects_bad_cursor_and_match(users):
+    with pytest.raises(erri.BusinessError) as exc:
+        service.list_user_page("not-a-cursor")
+    assert exc.value.status_code == 400
+    with pytest.raises(erri.BusinessError):
+        service.list_user_page(filters=service.UserFilter(query="a", match="regex"))
+
+
+def _client() -> TestClient:
+    auth.EXEMPT_PATHS.clear()
+    app = FastAPI()
+    app.include_router(user_handler.router)
+    auth.setup_jwt_middleware(app)
+    return TestClient(app)
+
+
+def test_list_endpoint_pages_and_streams_for_admins(users, monkeypatch: pytest.MonkeyPatch):
+    client = _client()
+    admin = {"Authorization": "Bearer " + auth.create_token(User(id=1, username="root", password="x", role="admin"))}
+    member = {"Authorization": "Bearer " + auth.create_token(User(id=2, username="bob", password="x"))}
+
+    assert client.get("/user/", headers=member).status_code == 403
+
+    resp = client.get("/user/", params={"limit": 3}, headers=admin)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [item["username"] for item in body["items"]] == ["alice", "bob", "carol"]
+    assert "password" not in body["items"][0]
+    resp = client.get("/user/", params={"limit": 3, "cursor": body["next_cursor"]}, headers=admin)
+    assert [item["username"] for item in resp.json()["items"]] == ["dave_ops", "daveXops"]
+    assert resp.json()["next_cursor"] is None
+
+    monkeypatch.setattr(user_handler, "USER_LIST_STREAM_BATCH_SIZE", 2, raising=True)
+    resp = client.get("/user/", params={"stream": "true", "is_active": "true"}, headers=admin)
+    assert resp.headers["content-type"] == "application/x-ndjson"
+    assert [line.split('"username":"')[1].split('"')[0] for line in resp.text.splitlines()] == [
+        "alice",
+        "bob",
+        "dave_ops",
+        "daveXops",
+    ]
@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import SQLModel, create_engine
+
+from conf import db
+from user import model
+
+
+def test_create_user_is_a_single_insert_returning(sqlite_engine, user_cache, sql_statements):
+    sql_statements.clear()
+
+    user = model.create_user("alice", "hashed")
+
+    assert user is not None
+    assert user.id is not None
+    assert user.nickname == "alice"
+    assert user.role == "user"
+    assert user.is_active is True
+    assert len(sql_statements) == 1
+    assert sql_statements[0].lstrip().upper().startswith("INSERT")
+    assert "ON CONFLICT" in sql_statements[0].upper()
+    assert "RETURNING" in sql_statements[0].upper()
+
+
+def test_create_user_returns_none_on_username_conflict(sqlite_engine, user_cache):
+    first = model.create_user("alice", "hashed")
+    second = model.create_user("alice", "other")
+
+    assert first is not None
+    assert second is None
+    user_cache.clear()
+    assert model.get_user("alice").password == "hashed"
+
+
+def test_update_user_profile_is_a_single_update_returning(sqlite_engine, user_cache, sql_statements):
+    model.create_user("alice", "hashed")
+    sql_statements.clear()
+
+    user = model.update_user_profile("alice", nickname="Alice", email="alice@example.com")
+
+    assert user is not None
+    assert user.nickname == "Alice"
+    assert user.email == "alice@example.com"
+    assert len(sql_statements) == 1
+    assert sql_statements[0].lstrip().upper().startswith("UPDATE")
+    assert "RETURNING" in sql_statements[0].upper()
+    assert "avatar_url" not in sql_statements[0].split("RETURNING")[0]
+
+
+def test_update_user_profile_without_fields_does_not_write(sqlite_engine, user_cache, sql_statements):
+    model.create_user("alice", "hashed")
+    user_cache.clear()
+    sql_statements.clear()
+
+    user = model.update_user_profile("alice")
+
+    assert user is not None
+    assert user.username == "alice"
+    assert all(s.lstrip().upper().startswith("SELECT") for s in sql_statements)
+
+
+def test_update_user_profile_returns_none_for_unknown_user(sqlite_engine, user_cache):
+    assert model.update_user_profile("ghost", nickname="Boo") is None
+
+
+@pytest.fixture
+def file_engine(tmp_path, monkeypatch: pytest.MonkeyPatch):
+    # Separate connections, so two writers really are in flight at once.
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine, raising=True)
+    yield engine
+    engine.dispose()
+
+
+def _interleave(engine, first, second):
+    # second opens its session and stops just before its UPDATE; first runs and
+    # commits; then second's UPDATE goes ahead against the row first left behind.
+    paused, resume = threading.Event(), threading.Event()
+    result = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _pause(conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread() is writer and statement.lstrip().upper().startswith("UPDATE"):
+            paused.set()
+            resume.wait(5)
+
+    writer = threading.Thread(target=lambda: result.append(second()))
+    writer.start()
+    assert paused.wait(5)
+    first()
+    resume.set()
+    writer.join(5)
+    return result[0]
+
+
+def test_interleaved_updates_to_different_columns_do_not_clobber(file_engine, user_cache):
+    model.create_user("alice", "hashed")
+
+    second = _interleave(
+        file_engine,
+        lambda: model.update_user_profile("alice", nickname="Alice", avatar_url="a.png"),
+        lambda: model.update_user_profile("alice", email="alice@example.com"),
+    )
+
+    assert (second.nickname, second.email, second.avatar_url) == ("Alice", "alice@example.com", "a.png")
+    user_cache.clear()
+    user = model.get_user("alice")
+    assert (user.nickname, user.email, user.avatar_url) == ("Alice", "alice@example.com", "a.png")
+
+
+def test_interleaved_updates_to_same_column_are_last_writer_wins(file_engine, user_cache):
+    model.create_user("alice", "hashed")
+
+    second = _interleave(
+        file_engine,
+        lambda: model.update_user_profile("alice", nickname="first", email="first@example.com"),
+        lambda: model.update_user_profile("alice", nickname="second"),
+    )
+
+    assert (second.nickname, second.email) == ("second", "first@example.com")
+    user_cache.clear()
+    user = model.get_user("alice")
+    assert (user.nickname, user.email) == ("second", "first@example.com")
+
+
+def _commit_update_before_fill(monkeypatch, fill_name, **changes):
+    fill = getattr(model, fill_name)
+
+    def racing_fill(*args):
+        # The reader's SELECT has returned the old row; a PATCH commits now.
+        model.update_user_profile("alice", **changes)
+        fill(*args)
+
+    monkeypatch.setattr(model, fill_name, racing_fill, raising=True)
+
+
+def test_load_racing_an_update_does_not_cache_the_old_row(sqlite_engine, user_cache, monkeypatch):
+    model.create_user("alice", "hashed")
+    user_cache.clear()
+    _commit_update_before_fill(monkeypatch, "_cache_fill", nickname="fresh")
+
+    assert model.get_user("alice").nickname == "alice"
+    assert model._cache_get("alice").nickname == "fresh"
+    assert model.get_user("alice").nickname == "fresh"
+
+
+def test_batch_load_racing_an_update_does_not_cache_the_old_rows(sqlite_engine, user_cache, monkeypatch):
+    model.create_user("alice", "hashed")
+    model.create_user("bob", "hashed")
+    user_cache.clear()
+    _commit_update_before_fill(monkeypatch, "_cache_fill_batch", nickname="fresh")
+
+    assert {u.nickname for u in model.get_users(usernames=["alice", "bob"])} == {"alice", "bob"}
+    assert model._cache_get("alice").nickname == "fresh"
+    assert model._cache_get("bob") is None
@@ -0,0 +1,58 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from user import password as passwords
+
+
+@pytest.fixture(autouse=True)
+def _cheap_kdf(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "PASSWORD_SCRYPT_LN", 4, raising=True)
+
+
+def test_legacy_hash_uses_global_salt(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "PASSWORD_SALT", "salt", raising=True)
+    expected = hashlib.sha512(("pw" + "salt").encode("utf-8")).hexdigest()
+    assert passwords.legacy_hash("pw") == expected
+    assert passwords.verify_password("pw", expected)
+    assert not passwords.verify_password("wrong", expected)
+
+
+def test_hash_password_uses_per_user_salt_and_encodes_params():
+    first = passwords.hash_password("pw")
+    second = passwords.hash_password("pw")
+    assert first != second
+    scheme, params, salt, key = first.split("$")[1:]
+    assert scheme == "scrypt"
+    assert params == "ln=4,r=8,p=1"
+    assert salt and key
+
+
+def test_verify_password_honours_params_stored_in_hash(monkeypatch: pytest.MonkeyPatch):
+    encoded = passwords.hash_password("pw")
+    monkeypatch.setattr(passwords, "PASSWORD_SCRYPT_LN", 5, raising=True)
+    assert passwords.verify_password("pw", encoded)
+    assert passwords.needs_rehash(encoded)
+
+
+def test_verify_password_rejects_malformed_and_missing_hashes():
+    assert not passwords.verify_password("pw", None)
+    assert not passwords.verify_password("pw", "$scrypt$bogus$x$y")
+    assert not passwords.verify_password("pw", "plaintext")
+
+
+def test_needs_rehash_for_legacy_hash():
+    assert passwords.needs_rehash(passwords.legacy_hash("pw"))
+    assert not passwords.needs_rehash(passwords.hash_password("pw"))
+
+
+def test_async_hashing_runs_on_bounded_pool(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "PASSWORD_HASH_MAX_CONCURRENCY", 2, raising=True)
+
+    async def _main():
+        hashes = await asyncio.gather(*(passwords.hash_password_async(f"pw{i}") for i in range(6)))
+        checks = await asyncio.gather(*(passwords.verify_password_async(f"pw{i}", h) for i, h in enumerate(hashes)))
+        return checks
+
+    assert asyncio.run(_main()) == [True] * 6
@@ -1,30 +1,33 @@
-import hashlib
+import asyncio
 
 import pytest
 
 from common import erri
+from user import password as passwords
 from user import service
 from user.model import User
 
 
-def test_get_password_hash_uses_salt(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "PASSWORD_SALT", "salt", raising=True)
-    password = "pw"
-    expected = hashlib.sha512((password + "salt").encode("utf-8")).hexdigest()
-    assert service.get_password_hash(password) == expected
+@pytest.fixture(autouse=True)
+def _cheap_kdf(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(passwords, "PASSWORD_SCRYPT_LN", 4, raising=True)
+
+
+def test_get_password_hash_uses_versioned_kdf_format():
+    encoded = service.get_password_hash("pw")
+    assert encoded.startswith("$scrypt$ln=4,r=8,p=1$")
+    assert passwords.verify_password("pw", encoded)
+    assert service.get_password_hash("pw") != encoded
 
 
 def test_register_user_when_user_exists(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: User(id=1, username=username, password="x"), raising=True)
+    monkeypatch.setattr(service, "create_user", lambda username, password: None, raising=True)
     with pytest.raises(erri.BusinessError) as exc:
         service.register_user("alice", "pw")
     assert exc.value.status_code == 409
 
 
 def test_register_user_success_hashes_password_and_calls_create(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "PASSWORD_SALT", "salt", raising=True)
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
-
     captured: dict[str, str] = {}
 
     def _create_user(username: str, password: str):
@@ -38,19 +41,27 @@ def test_register_user_success_hashes_password_and_calls_create(monkeypatch: pyt
     assert user.id == 123
     assert user.username == "alice"
     assert captured["username"] == "alice"
-    assert captured["password"] == service.get_password_hash("pw")
+    assert passwords.verify_password("pw", captured["password"])
 
 
-def test_register_user_create_failed_returns_none(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
-    monkeypatch.setattr(service, "create_user", lambda username, password: None, raising=True)
-    with pytest.raises(erri.BusinessError) as exc:
+def test_register_user_does_not_look_up_existing_user(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "get_user", lambda username: pytest.fail("unexpected lookup"), raising=True)
+    monkeypatch.setattr(
+        service, "create_user", lambda username, password: User(id=1, username=username, password=password), raising=True
+    )
+    assert service.register_user("alice", "pw").id == 1
+
+
+def test_register_user_surfaces_database_errors(monkeypatch: pytest.MonkeyPatch):
+    def _create_user(username: str, password: str):
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(service, "create_user", _create_user, raising=True)
+    with pytest.raises(RuntimeError):
         service.register_user("alice", "pw")
-    assert exc.value.status_code == 500
 
 
 def test_register_user_create_failed_returns_user_without_id(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
     monkeypatch.setattr(
         service, "create_user", lambda username, password: User(id=None, username=username, password=password), raising=True
     )
@@ -60,34 +71,31 @@ def test_register_user_create_failed_returns_user_without_id(monkeypatch: pytest
 
 
 def test_login_user_user_not_found(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "get_user", lambda username: None, raising=True)
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: None, raising=True)
     with pytest.raises(erri.BusinessError) as exc:
         service.login_user("alice", "pw")
     assert exc.value.status_code == 401
 
 
 def test_login_user_password_mismatch(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "PASSWORD_SALT", "salt", raising=True)
     user = User(id=1, username="alice", password=service.get_password_hash("correct"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: user, raising=True)
     with pytest.raises(erri.BusinessError) as exc:
         service.login_user("alice", "wrong")
     assert exc.value.status_code == 401
 
 
 def test_login_user_user_without_id(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "PASSWORD_SALT", "salt", raising=True)
     user = User(id=None, username="alice", password=service.get_password_hash("pw"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: user, raising=True)
     with pytest.raises(erri.BusinessError) as exc:
         service.login_user("alice", "pw")
     assert exc.value.status_code == 401
 
 
 def test_login_user_success_creates_token(monkeypatch: pytest.MonkeyPatch):
-    monkeypatch.setattr(service, "PASSWORD_SALT", "salt", raising=True)
     user = User(id=7, username="alice", password=service.get_password_hash("pw"))
-    monkeypatch.setattr(service, "get_user", lambda username: user, raising=True)
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: user, raising=True)
 
     captured: dict[str, object] = {}
 
@@ -100,3 +108,92 @@ def test_login_user_success_creates_token(monkeypatch: pytest.MonkeyPatch):
     token = service.login_user("alice", "pw")
     assert token == "token-123"
     assert captured["user"] is user
+
+
+def test_get_user_profile_async_runs_sync_path_when_async_db_disabled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "DB_ASYNC", False, raising=True)
+    monkeypatch.setattr(service, "get_user", lambda username: User(id=1, username=username, password="x"), raising=True)
+
+    async def _get_user_async(username: str):
+        raise AssertionError("async model must not be used")
+
+    monkeypatch.setattr(service, "get_user_async", _get_user_async, raising=True)
+
+    user = asyncio.run(service.get_user_profile_async("alice"))
+    assert user.username == "alice"
+
+
+def test_get_user_profile_async_uses_async_model_when_enabled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "DB_ASYNC", True, raising=True)
+
+    async def _get_user_async(username: str):
+        return None
+
+    monkeypatch.setattr(service, "get_user_async", _get_user_async, raising=True)
+    with pytest.raises(erri.BusinessError) as exc:
+        asyncio.run(service.get_user_profile_async("alice"))
+    assert exc.value.status_code == 404
+
+
+def test_register_user_async_conflict_when_user_exists(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "DB_ASYNC", True, raising=True)
+
+    async def _create_user_async(username: str, password: str):
+        return None
+
+    monkeypatch.setattr(service, "create_user_async", _create_user_async, raising=True)
+    with pytest.raises(erri.BusinessError) as exc:
+        asyncio.run(service.register_user_async("alice", "pw"))
+    assert exc.value.status_code == 409
+
+
+def test_login_user_async_creates_token(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "DB_ASYNC", True, raising=True)
+    user = User(id=7, username="alice", password=service.get_password_hash("pw"))
+
+    async def _get_user_credentials_async(username: str):
+        return user
+
+    monkeypatch.setattr(service, "get_user_credentials_async", _get_user_credentials_async, raising=True)
+    monkeypatch.setattr(service.auth, "create_token", lambda passed_user: "token-123", raising=True)
+
+    assert asyncio.run(service.login_user_async("alice", "pw")) == "token-123"
+
+
+def test_update_my_profile_async_uses_async_model_when_enabled(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(service, "DB_ASYNC", True, raising=True)
+
+    async def _update_user_profile_async(username: str, *, nickname, email, avatar_url):
+        return User(id=1, username=username, password="x", nickname=nickname)
+
+    monkeypatch.setattr(service, "update_user_profile_async", _update_user_profile_async, raising=True)
+    user = asyncio.run(service.update_my_profile_async("alice", nickname="A", email=None, avatar_url=None))
+    assert user.nickname == "A"
+
+
+def test_login_user_upgrades_legacy_password_hash(monkeypatch: pytest.MonkeyPatch):
+    user = User(id=7, username="alice", password=passwords.legacy_hash("pw"))
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: user, raising=True)
+    monkeypatch.setattr(service.auth, "create_token", lambda passed_user: "token-123", raising=True)
+
+    captured: dict[str, str] = {}
+
+    def _update_user_password(username: str, password: str):
+        captured[username] = password
+
+    monkeypatch.setattr(service, "update_user_password", _update_user_password, raising=True)
+
+    assert service.login_user("alice", "pw") == "token-123"
+    assert captured["alice"].startswith("$scrypt$")
+    assert passwords.verify_password("pw", captured["alice"])
+
+
+def test_login_user_does_not_rehash_current_password(monkeypatch: pytest.MonkeyPatch):
+    user = User(id=7, username="alice", password=service.get_password_hash("pw"))
+    monkeypatch.setattr(service, "get_user_credentials", lambda username: user, raising=True)
+    monkeypatch.setattr(service.auth, "create_token", lambda passed_user: "token-123", raising=True)
+    monkeypatch.setattr(
+        service, "update_user_password", lambda username, password: pytest.fail("unexpected rehash"), raising=True
+    )
+
+    assert service.login_user("alice", "pw") == "token-123"
@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Optional
+
+from sqlalchemy import Connection, text
+from sqlalchemy.dialects import sqlite
+
+from conf import db
+from conf.config import BULK_IMPORT_BATCH_SIZE, BULK_IMPORT_MAX_LINE_BYTES
+from middleware.profiling import run_in_threadpool
+from user import password as passwords
+from user.model import User
+
+FORMATS = ("ndjson", "csv")
+COLUMNS = ("username", "password", "nickname", "email", "avatar_url")
+
+_STAGING_TABLE = """
+CREATE TEMP TABLE user_import (
+    username text NOT NULL,
+    password text NOT NULL,
+    nickname text,
+    email text,
+    avatar_url text
+) ON COMMIT DROP
+"""
+_MERGE = """
+INSERT INTO "user" (username, password, nickname, email, avatar_url, role, is_active, created_at, updated_at)
+SELECT username, password, COALESCE(nickname, username), email, avatar_url, 'user', true, now(), now()
+FROM user_import
+ON CONFLICT (username) DO NOTHING
+RETURNING username
+"""
+
+
+@dataclass
+class ImportRow:
+    line: int
+    username: Optional[str] = None
+    password: Optional[str] = None
+    nickname: Optional[str] = None
+    email: Optional[str] = None
+    avatar_url: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+    def values(self) -> tuple[Optional[str], ...]:
+        return (self.username, self.password, self.nickname, self.email, self.avatar_url)
+
+    def report(self) -> dict[str, Any]:
+        entry: dict[str, Any] = {"line": self.line, "username": self.username, "status": self.status}
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+
+@dataclass
+class ImportSummary:
+    counts: dict[str, int] = field(default_factory=lambda: {"created": 0, "duplicate": 0, "invalid": 0})
+
+    def add(self, row: ImportRow) -> None:
+        self.counts[row.status or "invalid"] += 1
+
+
+def detect_format(content_type: Optional[str], explicit: Optional[str] = None) -> str:
+    if explicit:
+        if explicit not in FORMATS:
+            raise ValueError(f"unsupported import format: {explicit!r}")
+        return explicit
+    if content_type and "csv" in content_type:
+        return "csv"
+    return "ndjson"
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Optional[bytes]]:
+    buffer = b""
+    oversized = False
+    async for chunk in chunks:
+        buffer += chunk
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            line, buffer = buffer[:end], buffer[end + 1 :]
+            yield None if oversized or len(line) > BULK_IMPORT_MAX_LINE_BYTES else line
+            oversized = False
+        # An unterminated line already over the limit is dropped rather than buffered.
+        if len(buffer) > BULK_IMPORT_MAX_LINE_BYTES:
+            buffer = b""
+            oversized = True
+    if buffer or oversized:
+        yield None if oversized or len(buffer) > BULK_IMPORT_MAX_LINE_BYTES else buffer
+
+
+def _invalid(row: ImportRow, error: str) -> ImportRow:
+    row.status = "invalid"
+    row.error = error
+    return row
+
+
+def _parse(number: int, line: Optional[bytes], fmt: str, header: Optional[list[str]]) -> ImportRow:
+    row = ImportRow(line=number)
+    if line is None:
+        return _invalid(row, f"line exceeds {BULK_IMPORT_MAX_LINE_BYTES} bytes")
+    try:
+        text_line = line.decode("utf-8").rstrip("\r")
+        if fmt == "csv":
+            values = next(csv.reader([text_line]))
+            record: Any = dict(zip(header or COLUMNS, values))
+        else:
+            record = json.loads(text_line)
+    except (UnicodeDecodeError, ValueError, StopIteration) as e:
+        return _invalid(row, f"unparseable record: {e}")
+    if not isinstance(record, dict):
+        return _invalid(row, "record must be an object")
+
+    for column in COLUMNS:
+        value = record.get(column)
+        if value is not None and not isinstance(value, str):
+            return _invalid(row, f"{column} must be a string")
+        setattr(row, column, value or None)
+    if not row.username:
+        return _invalid(row, "username is required")
+    if not row.password:
+        return _invalid(row, "password is required")
+    return row
+
+
+def _copy_batch(conn: Connection, rows: list[ImportRow]) -> set[str]:
+    driver = conn.connection.driver_connection
+    with driver.cursor() as cursor:
+        cursor.execute(_STAGING_TABLE)
+        with cursor.copy(f"COPY user_import ({', '.join(COLUMNS)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row.values())
+        cursor.execute(_MERGE)
+        return {username for (username,) in cursor.fetchall()}
+
+
+def _insert_batch(conn: Connection, rows: list[ImportRow]) -> set[str]:
+    values = [
+        User(username=row.username, password=row.password, nickname=row.nickname or row.username, email=row.email, avatar_url=row.avatar_url).model_dump(exclude={"id"})
+        for row in rows
+    ]
+    statement = (
+        sqlite.insert(User)
+        .values(values)
+        .on_conflict_do_nothing(index_elements=["username"])
+        .returning(User.__table__.c.username)
+    )
+    return set(conn.execute(statement).scalars())
+
+
+def _load_batch(rows: list[ImportRow]) -> set[str]:
+    with db.engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            return _copy_batch(conn, rows)
+        return _insert_batch(conn, rows)
+
+
+async def _flush(batch: list[ImportRow]) -> list[ImportRow]:
+    seen: set[str] = set()
+    pending: list[ImportRow] = []
+    for row in batch:
+        if row.status is not None:
+            continue
+        if row.username in seen:
+            row.status = "duplicate"
+            continue
+        seen.add(row.username)
+        pending.append(row)
+
+    if pending:
+        hashes = await asyncio.gather(*(passwords.hash_password_async(row.password) for row in pending))
+        for row, hashed in zip(pending, hashes):
+            row.password = hashed
+        created = await run_in_threadpool(_load_batch, pending)
+        for row in pending:
+            row.status = "created" if row.username in created else "duplicate"
+    for row in batch:
+        row.password = None
+    return batch
+
+
+async def import_users(chunks: AsyncIterable[bytes], fmt: str, batch_size: int = BULK_IMPORT_BATCH_SIZE) -> AsyncIterator[dict[str, Any]]:
+    summary = ImportSummary()
+    header: Optional[list[str]] = None
+    batch: list[ImportRow] = []
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        if line is not None and not line.strip():
+            continue
+        if fmt == "csv" and header is None:
+            header = [name.strip() for name in next(csv.reader([(line or b"").decode("utf-8", "replace")]), [])]
+            continue
+        batch.append(_parse(number, line, fmt, header))
+        if len(batch) >= batch_size:
+            for row in await _flush(batch):
+                summary.add(row)
+                yield row.report()
+            batch = []
+    if batch:
+        for row in await _flush(batch):
+            summary.add(row)
+            yield row.report()
+    yield {"summary": summary.counts}
+
+
+async def ndjson_report(entries: AsyncIterable[dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for entry in entries:
+        yield json.dumps(entry, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+async def _read_chunks(source: BinaryIO, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    while chunk := source.read(chunk_size):
+        yield chunk
+
+
+async def _run_cli(path: str, fmt: str, batch_size: int) -> dict[str, int]:
+    summary: dict[str, int] = {}
+    with (sys.stdin.buffer if path == "-" else open(path, "rb")) as source:
+        async for entry in import_users(_read_chunks(source), fmt, batch_size):
+            sys.stdout.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            summary = entry.get("summary", summary)
+    return summary
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m user.bulk_import", description="Bulk import users from NDJSON or CSV.")
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=BULK_IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    summary = asyncio.run(_run_cli(args.path, fmt, args.batch_size))
+    passwords.shutdown()
+    return 0 if not summary.get("invalid") else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,12 +1,15 @@
+from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class UserRegisterRequest(BaseModel):
     username: str
     password: str
 
 class UserRegisterResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     username: str
 
@@ -23,6 +26,8 @@ class UserWhoAmIResponse(BaseModel):
 
 
 class UserProfileResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     username: str
     nickname: Optional[str]
     email: Optional[str]
@@ -31,7 +36,46 @@ class UserProfileResponse(BaseModel):
     is_active: bool
 
 
+class UserPublicProfile(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    nickname: Optional[str]
+    avatar_url: Optional[str]
+
+
+class UserBatchRequest(BaseModel):
+    ids: list[int] = []
+    usernames: list[str] = []
+
+
+class UserBatchResponse(BaseModel):
+    by_id: dict[int, UserPublicProfile]
+    by_username: dict[str, UserPublicProfile]
+    missing_ids: list[int]
+    missing_usernames: list[str]
+
+
 class UserProfileUpdateRequest(BaseModel):
     nickname: Optional[str] = None
     email: Optional[str] = None
     avatar_url: Optional[str] = None
+
+
+class UserListItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    username: str
+    nickname: Optional[str]
+    email: Optional[str]
+    avatar_url: Optional[str]
+    role: str
+    is_active: bool
+    created_at: datetime
+
+
+class UserListResponse(BaseModel):
+    items: list[UserListItem]
+    next_cursor: Optional[str]
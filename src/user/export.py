@@ -0,0 +1,117 @@
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from sqlalchemy import select
+
+from conf import db
+from conf.config import DB_ASYNC, USER_EXPORT_BATCH_SIZE
+from user.model import User
+
+FORMATS = ("ndjson", "csv")
+COLUMNS = ("id", "username", "nickname", "email", "avatar_url", "role", "is_active", "created_at", "updated_at")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_statement = select(*(User.__table__.c[name] for name in COLUMNS)).order_by(User.__table__.c.id)
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _ndjson_batch(rows: Sequence[Sequence[Any]]) -> bytes:
+    lines = [json.dumps(dict(zip(COLUMNS, map(_plain, row))), separators=(",", ":")) for row in rows]
+    lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+def _csv_batch(rows: Sequence[Sequence[Any]], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(COLUMNS)
+    writer.writerows([[_plain(value) for value in row] for row in rows])
+    return buffer.getvalue().encode("utf-8")
+
+
+class _Encoder:
+    def __init__(self, fmt: str, compress: bool) -> None:
+        self.fmt = fmt
+        self.header = fmt == "csv"
+        self.compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def _out(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) if self.compressor else data
+
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        if self.fmt == "ndjson":
+            return self._out(_ndjson_batch(rows))
+        header, self.header = self.header, False
+        return self._out(_csv_batch(rows, header=header))
+
+    def finish(self) -> bytes:
+        data = self._out(_csv_batch([], header=True)) if self.header else b""
+        return data + self.compressor.flush() if self.compressor else data
+
+
+# Rows stay as plain tuples from the cursor to the wire; a server-side cursor
+# (stream_results + yield_per) keeps only one batch in memory at a time.
+def iter_batches(batch_size: int = USER_EXPORT_BATCH_SIZE) -> Iterator[Sequence[Sequence[Any]]]:
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(_statement)
+        for partition in result.partitions():
+            yield partition
+
+
+async def iter_batches_async(batch_size: int = USER_EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence[Sequence[Any]]]:
+    async with db.async_engine.connect() as conn:
+        result = await conn.stream(_statement.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield partition
+
+
+def export_users(fmt: str, compress: bool = False, batch_size: int = USER_EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    encoder = _Encoder(fmt, compress)
+    for rows in iter_batches(batch_size):
+        yield encoder.encode(rows)
+    yield encoder.finish()
+
+
+async def export_users_async(fmt: str, compress: bool = False, batch_size: int = USER_EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    encoder = _Encoder(fmt, compress)
+    async for rows in iter_batches_async(batch_size):
+        yield encoder.encode(rows)
+    yield encoder.finish()
+
+
+def stream_export(fmt: str, compress: bool = False) -> Iterator[bytes] | AsyncIterator[bytes]:
+    if DB_ASYNC:
+        return export_users_async(fmt, compress)
+    return export_users(fmt, compress)
+
+
+def filename(fmt: str, compress: bool = False) -> str:
+    return f"users.{fmt}" + (".gz" if compress else "")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m user.export", description="Export the user table without passwords.")
+    parser.add_argument("-o", "--output", default="-", help="output file, or - for stdout")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=USER_EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    with (sys.stdout.buffer if args.output == "-" else open(args.output, "wb")) as target:
+        for chunk in export_users(args.format, args.gzip, args.batch_size):
+            target.write(chunk)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
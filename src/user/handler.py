@@ -1,75 +1,173 @@
-from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 
 from common import erri
+from common.response import FastJSONResponse
+from conf.config import (
+    THROTTLE_TRUSTED_PROXY_HOPS,
+    USER_LIST_DEFAULT_LIMIT,
+    USER_LIST_MAX_LIMIT,
+    USER_LIST_STREAM_BATCH_SIZE,
+)
+from user import bulk_import
+from user import export
 from user import dto
 from user import service
+from user import throttle
 from middleware import auth
 
 router = APIRouter(prefix="/user", tags=["user"])
 
+
+class _UploadStreamingResponse(StreamingResponse):
+    # The stock listener for http.disconnect would swallow request body messages still being read by the generator.
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _client_ip(request: Request) -> str:
+    # Each trusted proxy appends the address it received the request from, so the
+    # client is THROTTLE_TRUSTED_PROXY_HOPS entries from the right; anything further
+    # left was sent by the client and can be forged.
+    if THROTTLE_TRUSTED_PROXY_HOPS > 0:
+        forwarded = [a.strip() for a in ",".join(request.headers.getlist("x-forwarded-for")).split(",") if a.strip()]
+        if len(forwarded) >= THROTTLE_TRUSTED_PROXY_HOPS:
+            return forwarded[-THROTTLE_TRUSTED_PROXY_HOPS]
+    return request.client.host if request.client else "unknown"
+
+
+def _list_item(user) -> dto.UserListItem:
+    return dto.UserListItem.model_validate(user)
+
+
+async def _stream_users(page: service.UserPage, filters: service.UserFilter):
+    while True:
+        for user in page.items:
+            yield _list_item(user).model_dump_json().encode() + b"\n"
+        if page.next_cursor is None:
+            return
+        page = await service.list_user_page_async(page.next_cursor, USER_LIST_STREAM_BATCH_SIZE, filters)
+
+
+@router.get("/", response_model=dto.UserListResponse)
+async def list_users(
+    current_user: auth.AdminUser,
+    cursor: Optional[str] = None,
+    limit: int = Query(USER_LIST_DEFAULT_LIMIT, ge=1, le=USER_LIST_MAX_LIMIT),
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    q: Optional[str] = Query(None, min_length=1),
+    match: str = "prefix",
+    stream: bool = False,
+):
+    filters = service.UserFilter(role=role, is_active=is_active, query=q, match=match)
+    try:
+        page = await service.list_user_page_async(cursor, USER_LIST_STREAM_BATCH_SIZE if stream else limit, filters)
+    except erri.BusinessError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if stream:
+        return StreamingResponse(_stream_users(page, filters), media_type="application/x-ndjson")
+    return FastJSONResponse(dto.UserListResponse(items=[_list_item(user) for user in page.items], next_cursor=page.next_cursor))
+
+
 @auth.exempt
 @router.post("/register", response_model=dto.UserRegisterResponse)
 async def register(request: Request, body: dto.UserRegisterRequest):
     try:
-        user = service.register_user(body.username, body.password)
-        return dto.UserRegisterResponse(id=user.id, username=user.username)
+        throttle.check_register(_client_ip(request))
+        user = await service.register_user_async(body.username, body.password)
+        return FastJSONResponse(dto.UserRegisterResponse.model_validate(user))
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
 
 @auth.exempt
 @router.post("/login", response_model=dto.UserLoginResponse)
-async def login(request: Request, body: dto.UserLoginRequest, response: Response):
+async def login(request: Request, body: dto.UserLoginRequest):
     try:
-        token = service.login_user(body.username, body.password)
+        throttle.check_login(_client_ip(request), body.username)
+        token = await service.login_user_async(body.username, body.password)
+        response = FastJSONResponse(dto.UserLoginResponse())
         response.headers["x-jwt-token"] = token
-        return dto.UserLoginResponse()
+        return response
     except erri.BusinessError as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail)
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
 
 
 @router.get("/whoami", response_model=dto.UserWhoAmIResponse)
-async def whoami(request: Request):
+async def whoami(current_user: auth.CurrentUser):
+    return FastJSONResponse(dto.UserWhoAmIResponse(username=current_user.subject))
+
+
+@router.get("/me", response_model=dto.UserProfileResponse)
+async def get_me(current_user: auth.CurrentUser):
+    profile = current_user.fresh_profile()
+    if profile is not None:
+        return FastJSONResponse(
+            dto.UserProfileResponse(
+                username=current_user.subject,
+                nickname=profile.nickname,
+                email=profile.email,
+                avatar_url=profile.avatar_url,
+                role=current_user.role,
+                is_active=profile.is_active,
+            )
+        )
     try:
-        username = auth.get_username(request)
-        return dto.UserWhoAmIResponse(username=username)
+        user = await service.get_user_profile_async(current_user.subject)
+        return FastJSONResponse(dto.UserProfileResponse.model_validate(user))
     except erri.BusinessError as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
-@router.get("/me", response_model=dto.UserProfileResponse)
-async def get_me(request: Request):
+@router.post("/batch", response_model=dto.UserBatchResponse)
+async def batch_lookup(current_user: auth.CurrentUser, body: dto.UserBatchRequest):
     try:
-        username = auth.get_username(request)
-        user = service.get_user_profile(username)
-        return dto.UserProfileResponse(
-            username=user.username,
-            nickname=user.nickname,
-            email=user.email,
-            avatar_url=user.avatar_url,
-            role=user.role,
-            is_active=user.is_active,
-        )
+        batch = await service.lookup_users_async(body.ids, body.usernames)
     except erri.BusinessError as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return FastJSONResponse(
+        dto.UserBatchResponse(
+            by_id={i: dto.UserPublicProfile.model_validate(user) for i, user in batch.by_id.items()},
+            by_username={u: dto.UserPublicProfile.model_validate(user) for u, user in batch.by_username.items()},
+            missing_ids=batch.missing_ids,
+            missing_usernames=batch.missing_usernames,
+        )
+    )
 
 
 @router.patch("/me", response_model=dto.UserProfileResponse)
-async def update_me(request: Request, body: dto.UserProfileUpdateRequest):
+async def update_me(current_user: auth.CurrentUser, body: dto.UserProfileUpdateRequest):
     try:
-        username = auth.get_username(request)
-        user = service.update_my_profile(
-            username,
+        user = await service.update_my_profile_async(
+            current_user.subject,
             nickname=body.nickname,
             email=body.email,
             avatar_url=body.avatar_url,
         )
-        return dto.UserProfileResponse(
-            username=user.username,
-            nickname=user.nickname,
-            email=user.email,
-            avatar_url=user.avatar_url,
-            role=user.role,
-            is_active=user.is_active,
-        )
+        response = FastJSONResponse(dto.UserProfileResponse.model_validate(user))
+        if auth.JWT_PROFILE_CLAIMS:
+            response.headers["x-jwt-token"] = auth.create_token(user)
+        return response
     except erri.BusinessError as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@router.post("/admin/import")
+async def import_users(request: Request, current_user: auth.AdminUser, format: Optional[str] = None):
+    try:
+        fmt = bulk_import.detect_format(request.headers.get("content-type"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    report = bulk_import.import_users(request.stream(), fmt)
+    return _UploadStreamingResponse(bulk_import.ndjson_report(report), media_type="application/x-ndjson")
+
+
+@router.get("/admin/export")
+async def export_users(current_user: auth.AdminUser, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), gzip: bool = False):
+    media_type = "application/gzip" if gzip else export.MEDIA_TYPES[format]
+    headers = {"Content-Disposition": f'attachment; filename="{export.filename(format, gzip)}"'}
+    return StreamingResponse(export.stream_export(format, gzip), media_type=media_type, headers=headers)
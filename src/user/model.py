@@ -1,9 +1,23 @@
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone
-from typing import Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional, Sequence
 
+from sqlalchemy import ColumnElement, Integer, String, Select, any_, bindparam, func, or_, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.dml import Insert, Update
 from sqlmodel import Field, SQLModel, Session, select
 
-from conf.db import engine
+from common import metrics
+from common.cache import Cache, build_cache
+from common.singleflight import AsyncSingleFlight, SingleFlight
+from conf import db
+from conf.config import USER_CACHE_BACKEND, USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS, USER_CACHE_URL
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlmodel.ext.asyncio.session import AsyncSession
 
 class User(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
@@ -17,23 +31,202 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+
+DB_QUERY_SECONDS = metrics.histogram("db_query_seconds", "Time spent in user.model database calls.", ("op",))
+
+user_cache: Cache = build_cache(
+    USER_CACHE_BACKEND,
+    maxsize=USER_CACHE_SIZE,
+    ttl=USER_CACHE_TTL_SECONDS,
+    url=USER_CACHE_URL,
+    prefix="user:",
+)
+
+
+# Cached entries never carry the password hash (the shared backend would copy
+# it into Redis); users read back from the cache have an empty password, and
+# login reads the hash with get_user_credentials instead.
+def _cache_get(username: str) -> Optional[User]:
+    data = user_cache.get(username)
+    return User.model_validate({**data, "password": ""}) if data is not None else None
+
+
+def _cache_set(user: User) -> None:
+    user_cache.set(user.username, user.model_dump(mode="json", exclude={"password"}))
+
+
+# Concurrent cache misses for the same username (e.g. a shared service account
+# right after a deploy) share one SELECT instead of each issuing their own.
+_lookups = SingleFlight()
+_async_lookups = AsyncSingleFlight()
+
+
+# Every write bumps the username's generation (and the global one used by
+# batch loads by id). A load notes the generation before its SELECT and only
+# fills the cache if it is unchanged, so a read that raced a write can never put
+# the older row back over the writer's. Usernames share slots by hash to keep
+# this bounded; a collision only skips a fill.
+_GENERATION_SLOTS = 4096
+_generations = [0] * _GENERATION_SLOTS
+_write_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _slot(username: str) -> int:
+    return hash(username) % _GENERATION_SLOTS
+
+
+def _generation(username: str) -> int:
+    return _generations[_slot(username)]
+
+
+def _cache_fill(user: User, generation: int) -> None:
+    with _generation_lock:
+        if _generations[_slot(user.username)] == generation:
+            _cache_set(user)
+
+
+def _cache_fill_batch(users: list[User], write_generation: int) -> None:
+    with _generation_lock:
+        if _write_generation == write_generation:
+            for user in users:
+                _cache_set(user)
+
+
+# Called before and after a write: loads already running (or shared through
+# singleflight) when the write commits neither fill the cache nor serve later callers.
+def _invalidate(username: str) -> None:
+    global _write_generation
+    with _generation_lock:
+        _generations[_slot(username)] += 1
+        _write_generation += 1
+        user_cache.delete(username)
+    _lookups.forget(username)
+    _async_lookups.forget(username)
+
+
+def _cache_written(user: User) -> None:
+    _invalidate(user.username)
+    _cache_set(user)
+
+
+def _async_engine() -> "AsyncEngine":
+    if db.async_engine is None:
+        raise RuntimeError("Async database engine is disabled. Set DB_ASYNC=true to enable it.")
+    return db.async_engine
+
+
+@contextmanager
+def _session(op: str, **kwargs: Any) -> Iterator[Session]:
+    with DB_QUERY_SECONDS.time(op=op), Session(db.engine, **kwargs) as session:
+        yield session
+
+
+@asynccontextmanager
+async def _async_session(op: str, **kwargs: Any) -> AsyncIterator["AsyncSession"]:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    with DB_QUERY_SECONDS.time(op=op):
+        async with AsyncSession(_async_engine(), **kwargs) as session:
+            yield session
+
+
+def _insert_user(bind: Engine | Connection, username: str, password: str) -> Insert:
+    insert = postgresql.insert if bind.dialect.name == "postgresql" else sqlite.insert
+    values = User(username=username, password=password, nickname=username).model_dump(exclude={"id"})
+    return (
+        insert(User)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=["username"])
+        .returning(User)
+    )
+
+
 def create_user(username: str, password: str) -> Optional[User]:
-    user = User(username=username, password=password, nickname=username)
-    with Session(engine) as session:
-        try:
-            session.add(user)
-            session.commit()
-            session.refresh(user)
-        except Exception:
-            session.rollback()
-            return None
+    with _session("create_user", expire_on_commit=False) as session:
+        user = session.exec(_insert_user(db.engine, username, password)).scalar_one_or_none()
+        session.commit()
+    if user:
+        _cache_set(user)
+    return user
+
+def _load_user(username: str) -> Optional[User]:
+    generation = _generation(username)
+    with _session("get_user") as session:
+        user = session.exec(select(User).where(User.username == username)).one_or_none()
+    if user:
+        _cache_fill(user, generation)
     return user
 
+
 def get_user(username: str) -> Optional[User]:
-    with Session(engine) as session:
+    cached = _cache_get(username)
+    if cached is not None:
+        return cached
+    return _lookups.do(username, lambda: _load_user(username))
+
+
+# On Postgres each key list is bound as a single array parameter, so the
+# statement text (and its server-side plan) is the same for any batch size.
+def _in(bind: Engine | Connection, column: Any, name: str, values: Sequence[Any], type_: Any) -> ColumnElement[bool]:
+    if bind.dialect.name == "postgresql":
+        return column == any_(bindparam(name, list(values), type_=postgresql.ARRAY(type_)))
+    return column.in_(values)
+
+
+def _get_users(bind: Engine | Connection, ids: Sequence[int], usernames: Sequence[str]) -> Select:
+    conditions: list[ColumnElement[bool]] = []
+    if ids:
+        conditions.append(_in(bind, User.id, "ids", ids, Integer))
+    if usernames:
+        conditions.append(_in(bind, User.username, "usernames", usernames, String))
+    return select(User).where(or_(*conditions))
+
+
+def _cached_users(usernames: Sequence[str]) -> tuple[list[User], list[str]]:
+    found, remaining = [], []
+    for username in usernames:
+        cached = _cache_get(username)
+        if cached is not None:
+            found.append(cached)
+        else:
+            remaining.append(username)
+    return found, remaining
+
+
+def get_users(ids: Sequence[int] = (), usernames: Sequence[str] = ()) -> list[User]:
+    users, usernames = _cached_users(usernames)
+    if not ids and not usernames:
+        return users
+    write_generation = _write_generation
+    with _session("get_users") as session:
+        loaded = list(session.exec(_get_users(db.engine, ids, usernames)).all())
+    _cache_fill_batch(loaded, write_generation)
+    return users + loaded
+
+
+def get_user_credentials(username: str) -> Optional[User]:
+    with _session("get_user_credentials") as session:
         return session.exec(select(User).where(User.username == username)).one_or_none()
 
 
+def _profile_changes(**fields: Optional[str]) -> dict[str, str]:
+    return {name: value for name, value in fields.items() if value is not None}
+
+
+# A single UPDATE ... RETURNING takes the row lock and reads the result in one
+# round-trip. Only the columns present in the PATCH are written, so concurrent
+# updates to different columns never overwrite each other; concurrent updates
+# to the same column are last-writer-wins.
+def _update_profile(username: str, changes: dict[str, str]) -> Update:
+    return (
+        update(User)
+        .where(User.username == username)
+        .values(**changes, updated_at=func.now())
+        .returning(User)
+    )
+
+
 def update_user_profile(
     username: str,
     *,
@@ -41,20 +234,167 @@ def update_user_profile(
     email: Optional[str] = None,
     avatar_url: Optional[str] = None,
 ) -> Optional[User]:
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.username == username)).one_or_none()
-        if not user:
-            return None
-
-        if nickname is not None:
-            user.nickname = nickname
-        if email is not None:
-            user.email = email
-        if avatar_url is not None:
-            user.avatar_url = avatar_url
-
-        user.updated_at = datetime.now(timezone.utc)
-        session.add(user)
+    changes = _profile_changes(nickname=nickname, email=email, avatar_url=avatar_url)
+    if not changes:
+        return get_user(username)
+
+    _invalidate(username)
+    with _session("update_user_profile", expire_on_commit=False) as session:
+        user = session.exec(_update_profile(username, changes)).scalar_one_or_none()
+        session.commit()
+    if user:
+        _cache_written(user)
+    return user
+
+
+def update_user_password(username: str, password: str) -> None:
+    with _session("update_user_password") as session:
+        session.exec(
+            update(User)
+            .where(User.username == username)
+            .values(password=password, updated_at=datetime.now(timezone.utc))
+        )
         session.commit()
-        session.refresh(user)
-        return user
+    _invalidate(username)
+
+
+def _like_pattern(query: str, match: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%" if match == "prefix" else f"%{escaped}%"
+
+
+def _search(query: str, match: str) -> ColumnElement[bool]:
+    pattern = _like_pattern(query, match)
+    columns = (User.username, User.nickname, User.email)
+    if match == "prefix":
+        return or_(*(column.like(pattern, escape="\\") for column in columns))
+    return or_(*(column.ilike(pattern, escape="\\") for column in columns))
+
+
+# Keyset pagination: seek past the last (created_at, id) seen instead of OFFSET,
+# so every page is an index range scan of `limit` rows regardless of depth.
+def _list_users(
+    *,
+    after: Optional[tuple[datetime, int]],
+    limit: int,
+    role: Optional[str],
+    is_active: Optional[bool],
+    query: Optional[str],
+    match: str,
+) -> Select:
+    conditions: list[ColumnElement[bool]] = []
+    if after is not None:
+        conditions.append(tuple_(User.created_at, User.id) > tuple_(*after))
+    if role is not None:
+        conditions.append(User.role == role)
+    if is_active is not None:
+        conditions.append(User.is_active == is_active)
+    if query:
+        conditions.append(_search(query, match))
+    return select(User).where(*conditions).order_by(User.created_at, User.id).limit(limit)
+
+
+def list_users(
+    *,
+    after: Optional[tuple[datetime, int]] = None,
+    limit: int = 50,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    query: Optional[str] = None,
+    match: str = "prefix",
+) -> list[User]:
+    statement = _list_users(after=after, limit=limit, role=role, is_active=is_active, query=query, match=match)
+    with _session("list_users") as session:
+        return list(session.exec(statement).all())
+
+
+async def create_user_async(username: str, password: str) -> Optional[User]:
+    async with _async_session("create_user", expire_on_commit=False) as session:
+        result = await session.exec(_insert_user(_async_engine().sync_engine, username, password))
+        user = result.scalar_one_or_none()
+        await session.commit()
+    if user:
+        _cache_set(user)
+    return user
+
+
+async def _load_user_async(username: str) -> Optional[User]:
+    generation = _generation(username)
+    async with _async_session("get_user") as session:
+        result = await session.exec(select(User).where(User.username == username))
+        user = result.one_or_none()
+    if user:
+        _cache_fill(user, generation)
+    return user
+
+
+async def get_user_async(username: str) -> Optional[User]:
+    cached = _cache_get(username)
+    if cached is not None:
+        return cached
+    return await _async_lookups.do(username, lambda: _load_user_async(username))
+
+
+async def get_user_credentials_async(username: str) -> Optional[User]:
+    async with _async_session("get_user_credentials") as session:
+        result = await session.exec(select(User).where(User.username == username))
+        return result.one_or_none()
+
+
+async def get_users_async(ids: Sequence[int] = (), usernames: Sequence[str] = ()) -> list[User]:
+    users, usernames = _cached_users(usernames)
+    if not ids and not usernames:
+        return users
+    write_generation = _write_generation
+    async with _async_session("get_users") as session:
+        result = await session.exec(_get_users(_async_engine().sync_engine, ids, usernames))
+        loaded = list(result.all())
+    _cache_fill_batch(loaded, write_generation)
+    return users + loaded
+
+
+async def update_user_profile_async(
+    username: str,
+    *,
+    nickname: Optional[str] = None,
+    email: Optional[str] = None,
+    avatar_url: Optional[str] = None,
+) -> Optional[User]:
+    changes = _profile_changes(nickname=nickname, email=email, avatar_url=avatar_url)
+    if not changes:
+        return await get_user_async(username)
+
+    _invalidate(username)
+    async with _async_session("update_user_profile", expire_on_commit=False) as session:
+        result = await session.exec(_update_profile(username, changes))
+        user = result.scalar_one_or_none()
+        await session.commit()
+    if user:
+        _cache_written(user)
+    return user
+
+
+async def update_user_password_async(username: str, password: str) -> None:
+    async with _async_session("update_user_password") as session:
+        await session.exec(
+            update(User)
+            .where(User.username == username)
+            .values(password=password, updated_at=datetime.now(timezone.utc))
+        )
+        await session.commit()
+    _invalidate(username)
+
+
+async def list_users_async(
+    *,
+    after: Optional[tuple[datetime, int]] = None,
+    limit: int = 50,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    query: Optional[str] = None,
+    match: str = "prefix",
+) -> list[User]:
+    statement = _list_users(after=after, limit=limit, role=role, is_active=is_active, query=query, match=match)
+    async with _async_session("list_users") as session:
+        result = await session.exec(statement)
+        return list(result.all())
@@ -0,0 +1,149 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from common import metrics
+from conf.config import (
+    PASSWORD_HASH_MAX_CONCURRENCY,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_SALT,
+    PASSWORD_SCRYPT_LN,
+    PASSWORD_SCRYPT_P,
+    PASSWORD_SCRYPT_R,
+)
+from middleware.profiling import bind_thread
+
+SCHEME = "scrypt"
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+_LEGACY_PATTERN = re.compile(r"^[0-9a-f]{128}$")
+_PARAMS_PATTERN = re.compile(r"^ln=(\d+),r=(\d+),p=(\d+)$")
+
+T = TypeVar("T")
+
+PASSWORD_HASH_SECONDS = metrics.histogram(
+    "password_hash_seconds",
+    "Password KDF time by operation.",
+    ("op",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, ln: int, r: int, p: int) -> bytes:
+    n = 1 << ln
+    return hashlib.scrypt(
+        password.encode("utf-8"),
+        salt=salt,
+        n=n,
+        r=r,
+        p=p,
+        maxmem=2 * 128 * n * r * p,
+        dklen=KEY_BYTES,
+    )
+
+
+def legacy_hash(password: str) -> str:
+    return hashlib.sha512((password + PASSWORD_SALT).encode("utf-8")).hexdigest()
+
+
+@metrics.timed(PASSWORD_HASH_SECONDS, op="hash")
+def _hash(password: str) -> str:
+    salt = os.urandom(SALT_BYTES)
+    key = _scrypt(password, salt, PASSWORD_SCRYPT_LN, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    params = f"ln={PASSWORD_SCRYPT_LN},r={PASSWORD_SCRYPT_R},p={PASSWORD_SCRYPT_P}"
+    return f"${SCHEME}${params}${_b64encode(salt)}${_b64encode(key)}"
+
+
+@metrics.timed(PASSWORD_HASH_SECONDS, op="verify")
+def _verify(password: str, encoded: Optional[str]) -> bool:
+    if encoded is None:
+        _hash(password)
+        return False
+    if _LEGACY_PATTERN.match(encoded):
+        return hmac.compare_digest(legacy_hash(password), encoded)
+
+    parts = encoded.split("$")
+    if len(parts) != 5 or parts[1] != SCHEME:
+        return False
+    params = _PARAMS_PATTERN.match(parts[2])
+    if not params:
+        return False
+    ln, r, p = (int(v) for v in params.groups())
+    try:
+        salt, expected = _b64decode(parts[3]), _b64decode(parts[4])
+    except ValueError:
+        return False
+    return hmac.compare_digest(_scrypt(password, salt, ln, r, p), expected)
+
+
+def needs_rehash(encoded: str) -> bool:
+    parts = encoded.split("$")
+    if len(parts) != 5 or parts[1] != SCHEME:
+        return True
+    return parts[2] != f"ln={PASSWORD_SCRYPT_LN},r={PASSWORD_SCRYPT_R},p={PASSWORD_SCRYPT_P}"
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    return _executor
+
+
+def _semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(PASSWORD_HASH_MAX_CONCURRENCY)
+    return semaphore
+
+
+async def _run(fn: Callable[..., T], *args: object) -> T:
+    async with _semaphore():
+        return await asyncio.get_running_loop().run_in_executor(_pool(), bind_thread(fn), *args)
+
+
+def hash_password(password: str) -> str:
+    return _pool().submit(bind_thread(_hash), password).result()
+
+
+def verify_password(password: str, encoded: Optional[str]) -> bool:
+    return _pool().submit(bind_thread(_verify), password, encoded).result()
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(_hash, password)
+
+
+async def verify_password_async(password: str, encoded: Optional[str]) -> bool:
+    return await _run(_verify, password, encoded)
+
+
+def shutdown() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -1,29 +1,129 @@
-import hashlib
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Sequence
 
 from common import erri
-from conf.config import PASSWORD_SALT
+from conf.config import DB_ASYNC, USER_BATCH_MAX_KEYS, USER_LIST_DEFAULT_LIMIT
 from middleware import auth
-from user.model import create_user, get_user, update_user_profile, User
+from middleware.profiling import run_in_threadpool
+from user import password as passwords
+from user.model import (
+    create_user,
+    create_user_async,
+    get_user,
+    get_user_async,
+    get_user_credentials,
+    get_user_credentials_async,
+    get_users,
+    get_users_async,
+    list_users,
+    list_users_async,
+    update_user_password,
+    update_user_password_async,
+    update_user_profile,
+    update_user_profile_async,
+    User,
+)
+
+SEARCH_MATCHES = ("prefix", "substring")
+
+
+@dataclass(frozen=True, slots=True)
+class UserFilter:
+    role: Optional[str] = None
+    is_active: Optional[bool] = None
+    query: Optional[str] = None
+    match: str = "prefix"
+
+
+@dataclass(frozen=True, slots=True)
+class UserPage:
+    items: list[User]
+    next_cursor: Optional[str]
+
+
+@dataclass(frozen=True, slots=True)
+class UserBatch:
+    by_id: dict[int, User]
+    by_username: dict[str, User]
+    missing_ids: list[int]
+    missing_usernames: list[str]
+
+
+def encode_cursor(user: User) -> str:
+    raw = json.dumps([user.created_at.isoformat(), user.id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, user_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(user_id, int):
+            raise ValueError(user_id)
+        return datetime.fromisoformat(created_at), user_id
+    except (ValueError, TypeError):
+        raise erri.bad_request("Invalid cursor")
+
+
+def _page_args(cursor: Optional[str], limit: int, filters: UserFilter) -> dict:
+    if filters.match not in SEARCH_MATCHES:
+        raise erri.bad_request("Invalid match mode")
+    return {
+        "after": decode_cursor(cursor) if cursor else None,
+        "limit": limit + 1,
+        "role": filters.role,
+        "is_active": filters.is_active,
+        "query": filters.query,
+        "match": filters.match,
+    }
+
+
+def _page(users: list[User], limit: int) -> UserPage:
+    items = users[:limit]
+    return UserPage(items=items, next_cursor=encode_cursor(items[-1]) if len(users) > limit else None)
+
+
+def _batch_keys(ids: Sequence[int], usernames: Sequence[str]) -> tuple[list[int], list[str]]:
+    ids, usernames = list(dict.fromkeys(ids)), list(dict.fromkeys(usernames))
+    if len(ids) + len(usernames) > USER_BATCH_MAX_KEYS:
+        raise erri.bad_request(f"At most {USER_BATCH_MAX_KEYS} ids and usernames per request")
+    return ids, usernames
+
+
+def _batch(ids: list[int], usernames: list[str], users: list[User]) -> UserBatch:
+    by_id = {user.id: user for user in users if user.id is not None}
+    by_username = {user.username: user for user in users}
+    return UserBatch(
+        by_id={i: by_id[i] for i in ids if i in by_id},
+        by_username={u: by_username[u] for u in usernames if u in by_username},
+        missing_ids=[i for i in ids if i not in by_id],
+        missing_usernames=[u for u in usernames if u not in by_username],
+    )
+
 
 def get_password_hash(password: str) -> str:
-    return hashlib.sha512((password + PASSWORD_SALT).encode("utf-8")).hexdigest()
+    return passwords.hash_password(password)
 
 
 def register_user(username: str, password: str) -> User:
-    if get_user(username):
-        raise erri.conflict("User already exists")
     encrypted_password = get_password_hash(password)
     user = create_user(username, encrypted_password)
-    if not user or user.id is None:
+    if not user:
+        raise erri.conflict("User already exists")
+    if user.id is None:
         raise erri.internal("Create user failed")
     return user
 
 
 def login_user(username: str, password: str) -> str:
-    user = get_user(username)
-    encrypted_password = get_password_hash(password)
-    if not user or user.password != encrypted_password or user.id is None:
+    user = get_user_credentials(username)
+    verified = passwords.verify_password(password, user.password if user else None)
+    if not user or not verified or user.id is None:
         raise erri.unauthorized("Invalid credentials")
+    if passwords.needs_rehash(user.password):
+        update_user_password(username, get_password_hash(password))
     return auth.create_token(user)
 
 
@@ -39,3 +139,73 @@ def update_my_profile(username: str, *, nickname: str | None, email: str | None,
     if not user:
         raise erri.not_found("User not found")
     return user
+
+
+def list_user_page(cursor: Optional[str] = None, limit: int = USER_LIST_DEFAULT_LIMIT, filters: UserFilter = UserFilter()) -> UserPage:
+    return _page(list_users(**_page_args(cursor, limit, filters)), limit)
+
+
+def lookup_users(ids: Sequence[int] = (), usernames: Sequence[str] = ()) -> UserBatch:
+    ids, usernames = _batch_keys(ids, usernames)
+    return _batch(ids, usernames, get_users(ids, usernames))
+
+
+async def register_user_async(username: str, password: str) -> User:
+    if not DB_ASYNC:
+        return await run_in_threadpool(register_user, username, password)
+    encrypted_password = await passwords.hash_password_async(password)
+    user = await create_user_async(username, encrypted_password)
+    if not user:
+        raise erri.conflict("User already exists")
+    if user.id is None:
+        raise erri.internal("Create user failed")
+    return user
+
+
+async def login_user_async(username: str, password: str) -> str:
+    if not DB_ASYNC:
+        return await run_in_threadpool(login_user, username, password)
+    user = await get_user_credentials_async(username)
+    verified = await passwords.verify_password_async(password, user.password if user else None)
+    if not user or not verified or user.id is None:
+        raise erri.unauthorized("Invalid credentials")
+    if passwords.needs_rehash(user.password):
+        await update_user_password_async(username, await passwords.hash_password_async(password))
+    return auth.create_token(user)
+
+
+async def get_user_profile_async(username: str) -> User:
+    if not DB_ASYNC:
+        return await run_in_threadpool(get_user_profile, username)
+    user = await get_user_async(username)
+    if not user:
+        raise erri.not_found("User not found")
+    return user
+
+
+async def update_my_profile_async(
+    username: str, *, nickname: str | None, email: str | None, avatar_url: str | None
+) -> User:
+    if not DB_ASYNC:
+        return await run_in_threadpool(
+            update_my_profile, username, nickname=nickname, email=email, avatar_url=avatar_url
+        )
+    user = await update_user_profile_async(username, nickname=nickname, email=email, avatar_url=avatar_url)
+    if not user:
+        raise erri.not_found("User not found")
+    return user
+
+
+async def list_user_page_async(
+    cursor: Optional[str] = None, limit: int = USER_LIST_DEFAULT_LIMIT, filters: UserFilter = UserFilter()
+) -> UserPage:
+    if not DB_ASYNC:
+        return await run_in_threadpool(list_user_page, cursor, limit, filters)
+    return _page(await list_users_async(**_page_args(cursor, limit, filters)), limit)
+
+
+async def lookup_users_async(ids: Sequence[int] = (), usernames: Sequence[str] = ()) -> UserBatch:
+    if not DB_ASYNC:
+        return await run_in_threadpool(lookup_users, ids, usernames)
+    ids, usernames = _batch_keys(ids, usernames)
+    return _batch(ids, usernames, await get_users_async(ids, usernames))
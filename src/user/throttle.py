@@ -0,0 +1,49 @@
+from typing import Optional
+
+from common import erri, metrics
+from common.ratelimit import Rate, RateLimiter, build_limiter
+from conf.config import (
+    THROTTLE_BACKEND,
+    THROTTLE_LOGIN_GLOBAL,
+    THROTTLE_LOGIN_PER_IP,
+    THROTTLE_LOGIN_PER_USERNAME,
+    THROTTLE_MAX_KEYS,
+    THROTTLE_REGISTER_GLOBAL,
+    THROTTLE_REGISTER_PER_IP,
+    THROTTLE_URL,
+)
+
+THROTTLE_REJECTIONS = metrics.counter("throttle_rejections_total", "Requests rejected by a throttle limit.", ("limit",))
+
+limiter: RateLimiter = build_limiter(THROTTLE_BACKEND, max_keys=THROTTLE_MAX_KEYS, url=THROTTLE_URL, prefix="throttle:")
+
+LOGIN_LIMITS = {
+    "login_ip": Rate.parse(THROTTLE_LOGIN_PER_IP),
+    "login_username": Rate.parse(THROTTLE_LOGIN_PER_USERNAME),
+    "login_global": Rate.parse(THROTTLE_LOGIN_GLOBAL),
+}
+REGISTER_LIMITS = {
+    "register_ip": Rate.parse(THROTTLE_REGISTER_PER_IP),
+    "register_global": Rate.parse(THROTTLE_REGISTER_GLOBAL),
+}
+
+
+# Limits are listed narrowest first and checking stops at the first rejection,
+# so a request refused by its own IP's limit never spends tokens from the
+# per-username or global buckets that other clients share.
+def _check(limits: dict[str, Optional[Rate]], keys: dict[str, str]) -> None:
+    for name, rate in limits.items():
+        if rate is None:
+            continue
+        retry_after = limiter.hit(f"{name}:{keys[name]}", rate)
+        if retry_after > 0:
+            THROTTLE_REJECTIONS.inc(limit=name)
+            raise erri.too_many_requests("Too many requests", retry_after)
+
+
+def check_login(ip: str, username: str) -> None:
+    _check(LOGIN_LIMITS, {"login_ip": ip, "login_username": username.lower(), "login_global": "*"})
+
+
+def check_register(ip: str) -> None:
+    _check(REGISTER_LIMITS, {"register_ip": ip, "register_global": "*"})